@@ -0,0 +1,12 @@
+"""
+B-Transfer Core
+Copyright (c) 2025 Balsim Technologies. All rights reserved.
+Proprietary and confidential software.
+
+Storage, metadata, crypto and listing services shared by the full server
+(b_transfer_server.py) and the Vercel handler (api/index.py).
+"""
+
+from .web import create_app
+
+__version__ = '2.1.0'
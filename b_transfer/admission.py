@@ -0,0 +1,134 @@
+#!/usr/bin/env python3
+"""
+Upload Admission for B-Transfer
+Checks that need only request headers, run before any body byte is read,
+plus the per-file size limit enforced while multipart bodies stream in
+
+Clients may send X-File-Name (percent-encoded) and X-File-Size so type and
+size are checked before the multipart headers arrive. With
+Expect: 100-continue, 100 Continue is only sent once the upload is admitted.
+"""
+
+from urllib.parse import unquote
+from werkzeug.serving import WSGIRequestHandler
+from werkzeug.utils import secure_filename
+
+from . import config
+
+# Multipart boundaries, part headers and form fields on top of the file itself
+MULTIPART_OVERHEAD = 1024 * 1024
+UPLOAD_BODY_LIMIT = config.MAX_FILE_SIZE_PER_UPLOAD + MULTIPART_OVERHEAD
+
+
+class UploadRejected(Exception):
+    def __init__(self, message, status=400):
+        super().__init__(message)
+        self.status = status
+
+
+def allowed_file(filename):
+    return '.' in filename and filename.rsplit('.', 1)[1].lower() in config.ALLOWED_EXTENSIONS
+
+
+def declared_size(headers):
+    """File size the client announced in `X-File-Size`, or None"""
+    value = headers.get('X-File-Size', '')
+    return int(value) if value.isdigit() else None
+
+
+def check_declared(headers, content_length, body_limit):
+    """Reject from the declared name and sizes alone; raises UploadRejected
+
+    `X-File-Name` (percent-encoded) and `X-File-Size` are optional, so older
+    clients are checked once the multipart part headers arrive instead.
+    """
+    if content_length is not None and body_limit is not None and content_length > body_limit:
+        raise UploadRejected('File too large', 413)
+
+    size = declared_size(headers)
+    if size is not None and size > config.MAX_FILE_SIZE_PER_UPLOAD:
+        raise UploadRejected('File too large', 413)
+
+    name = headers.get('X-File-Name')
+    if name is not None:
+        name = unquote(name)
+        if not allowed_file(name):
+            raise UploadRejected('File type not allowed')
+        if not secure_filename(name):
+            raise UploadRejected('Invalid filename')
+
+
+class LimitedWriter:
+    """Spool for one multipart file part that aborts parsing once the part passes `limit`"""
+
+    def __init__(self, stream, limit):
+        self.stream = stream
+        self.limit = limit
+        self.written = 0
+
+    def write(self, data):
+        self.written += len(data)
+        if self.written > self.limit:
+            raise UploadRejected('File too large', 413)
+        return self.stream.write(data)
+
+    def __iter__(self):
+        return iter(self.stream)
+
+    def __getattr__(self, name):
+        return getattr(self.stream, name)
+
+
+class _ContinueOnRead:
+    """wsgi.input that sends `100 Continue` only when the application first reads the body"""
+
+    def __init__(self, stream, wfile):
+        self.stream = stream
+        self.wfile = wfile
+        self.continued = False
+
+    def _continue(self):
+        if not self.continued:
+            self.continued = True
+            self.wfile.write(b"HTTP/1.1 100 Continue\r\n\r\n")
+            self.wfile.flush()
+
+    def read(self, *args):
+        self._continue()
+        return self.stream.read(*args)
+
+    def readline(self, *args):
+        self._continue()
+        return self.stream.readline(*args)
+
+    def readinto(self, b):
+        self._continue()
+        return self.stream.readinto(b)
+
+    def __getattr__(self, name):
+        return getattr(self.stream, name)
+
+
+class DeferredContinueHandler(WSGIRequestHandler):
+    """Development server handler that defers `100 Continue` until the body is read
+
+    Werkzeug answers `Expect: 100-continue` before the app runs, so clients
+    start sending bodies the admission checks are about to reject. Deferring
+    it lets a rejected client get the error without sending the body.
+    """
+
+    def handle_expect_100(self):
+        return True  # answered on first read instead
+
+    def run_wsgi(self):
+        self.expect_continue = self.headers.get('Expect', '').lower().strip() == '100-continue'
+        if self.expect_continue:
+            del self.headers['Expect']
+        super().run_wsgi()
+
+    def make_environ(self):
+        environ = super().make_environ()
+        if getattr(self, 'expect_continue', False):
+            environ['HTTP_EXPECT'] = '100-continue'
+            environ['wsgi.input'] = _ContinueOnRead(environ['wsgi.input'], self.wfile)
+        return environ
@@ -0,0 +1,173 @@
+#!/usr/bin/env python3
+"""
+Capacity Manager for B-Transfer
+Disk-space admission control and high-water-mark eviction for the upload folder
+"""
+
+import os
+import shutil
+import threading
+import time
+import itertools
+
+from . import config
+
+MIN_FREE_BYTES = 512 * 1024 * 1024  # headroom kept for metadata, logs and temp files
+
+
+class CatalogEntry:
+    """A tracked file; no per-instance dict, so the catalog stays small with many files"""
+
+    __slots__ = ('size', 'created', 'locked')
+
+    def __init__(self, size, created, locked=False):
+        self.size = size
+        self.created = created
+        self.locked = locked
+
+
+class CapacityManager:
+    def __init__(self, root, quota=None, high_water=0.90, low_water=0.80,
+                 min_free=MIN_FREE_BYTES, evict=None, resync_interval=None):
+        self.root = root
+        self.quota = quota
+        self.high_water = high_water
+        self.low_water = low_water
+        self.min_free = min_free
+        self.evict = evict  # callback(name) -> bool, deletes a file and its metadata
+        self.resync_interval = resync_interval  # rescan period when other nodes share the folder
+
+        self._lock = threading.Lock()
+        self._files = {}  # name -> CatalogEntry, kept in upload order
+        self._used = 0
+        self._reserved = {}
+        self._ids = itertools.count(1)
+        self._loaded_at = None
+        self._evicting = False
+
+    def _load(self):
+        """Scan the upload folder once; later changes arrive as events"""
+        if self._loaded_at is not None:
+            if self.resync_interval is None or time.time() - self._loaded_at < self.resync_interval:
+                return
+            self._files = {}
+            self._used = 0
+        entries = []
+        for entry in os.scandir(self.root):
+            if entry.name.startswith('.') or not entry.is_file() or entry.name.endswith('.meta'):
+                continue
+            stat = entry.stat()
+            entries.append((stat.st_ctime, entry.name, stat.st_size))
+        entries.sort()
+        for created, name, size in entries:
+            self._files[name] = CatalogEntry(size, created)
+            self._used += size
+        self._loaded_at = time.time()
+
+    # Admission
+
+    def reserve(self, nbytes):
+        """Reserve space for an upload; returns a reservation id or None if it can't fit"""
+        with self._lock:
+            self._load()
+            pending = sum(self._reserved.values())
+            free = shutil.disk_usage(self.root).free - pending - self.min_free
+            if nbytes > free:
+                return None
+            if self.quota is not None and self._used + pending + nbytes > self.quota:
+                return None
+            reservation = next(self._ids)
+            self._reserved[reservation] = nbytes
+            return reservation
+
+    def release(self, reservation):
+        with self._lock:
+            self._reserved.pop(reservation, None)
+
+    def commit(self, reservation, name, nbytes):
+        """Turn a reservation into a tracked file of its actual stored size"""
+        with self._lock:
+            self._reserved.pop(reservation, None)
+            self._track(name, nbytes)
+        self._maybe_evict()
+
+    # Events
+
+    def record_update(self, name, nbytes, locked=None):
+        with self._lock:
+            self._load()
+            entry = self._files.get(name)
+            if entry is None:
+                self._track(name, nbytes)
+                entry = self._files[name]
+            else:
+                self._used += nbytes - entry.size
+                entry.size = nbytes
+            if locked is not None:
+                entry.locked = locked
+        self._maybe_evict()
+
+    def record_remove(self, name):
+        with self._lock:
+            entry = self._files.pop(name, None)
+            if entry:
+                self._used -= entry.size
+
+    def _track(self, name, nbytes):
+        entry = self._files.pop(name, None)
+        if entry:
+            self._used -= entry.size
+        self._files[name] = CatalogEntry(nbytes, time.time())
+        self._used += nbytes
+
+    # Eviction
+
+    def _capacity(self):
+        disk = shutil.disk_usage(self.root)
+        capacity = self._used + disk.free - self.min_free
+        if self.quota is not None:
+            capacity = min(capacity, self.quota)
+        return max(capacity, 1)
+
+    def _maybe_evict(self):
+        if self.evict is None:
+            return
+        with self._lock:
+            if self._evicting or self._used < self.high_water * self._capacity():
+                return
+            self._evicting = True
+        threading.Thread(target=self._evict_until_low_water, daemon=True).start()
+
+    def _evict_until_low_water(self):
+        try:
+            target = self.low_water * self._capacity()
+            now = time.time()
+            with self._lock:
+                # Oldest first: expired files, then anything not locked
+                expired = [n for n, entry in self._files.items() if now - entry.created > config.FILE_LIFETIME]
+                unlocked = [n for n, entry in self._files.items()
+                            if not entry.locked and now - entry.created <= config.FILE_LIFETIME]
+            for name in expired + unlocked:
+                if self._used <= target:
+                    break
+                try:
+                    if self.evict(name):
+                        self.record_remove(name)
+                        print(f"🧹 Evicted for disk space: {name}")
+                except Exception as e:
+                    print(f"⚠️ Eviction error for {name}: {e}")
+        finally:
+            with self._lock:
+                self._evicting = False
+
+    def usage(self):
+        with self._lock:
+            self._load()
+            capacity = self._capacity()
+            return {
+                'used_bytes': self._used,
+                'reserved_bytes': sum(self._reserved.values()),
+                'capacity_bytes': capacity,
+                'files': len(self._files),
+                'utilization': round(self._used / capacity, 3)
+            }
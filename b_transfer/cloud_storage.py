@@ -6,30 +6,109 @@ Handles file storage in Google Cloud Storage for large files (up to 5GB)
 
 import os
 import io
+import json
 import tempfile
-from google.oauth2.credentials import Credentials
-from google_auth_oauthlib.flow import InstalledAppFlow
-from google.auth.transport.requests import Request
-from googleapiclient.discovery import build
-from googleapiclient.http import MediaIoBaseUpload, MediaIoBaseDownload
-import pickle
+from urllib.parse import quote
+
+# The Google client libraries (and the discovery document) are imported on
+# first use so importing this module stays cheap for worker boot and cold starts
 
 # Google Cloud Storage API scopes
 SCOPES = ['https://www.googleapis.com/auth/devstorage.read_write']
 
+# Resumable upload chunks must be multiples of 256 KiB
+RESUMABLE_CHUNK_SIZE = 32 * 256 * 1024  # 8MB
+
+
+class ResumableUpload:
+    """Streaming upload of unknown length over a GCS resumable session"""
+    
+    def __init__(self, http, session_uri, chunk_size=RESUMABLE_CHUNK_SIZE):
+        self.http = http
+        self.session_uri = session_uri
+        self.chunk_size = chunk_size
+        self.offset = 0  # bytes GCS has persisted
+        self._buffer = bytearray()
+    
+    def write(self, data):
+        self._buffer += data
+        while len(self._buffer) >= self.chunk_size:
+            self._put(self.chunk_size, final=False)
+    
+    def finish(self):
+        """Send the tail and return the object resource (name, size, md5Hash, ...)"""
+        while True:
+            result = self._put(len(self._buffer), final=True)
+            if result is not None:
+                return result
+    
+    def abort(self):
+        try:
+            self.http.request(self.session_uri, method='DELETE')
+        except Exception:
+            pass
+    
+    def _put(self, nbytes, final):
+        total = str(self.offset + nbytes) if final else '*'
+        if nbytes:
+            content_range = f"bytes {self.offset}-{self.offset + nbytes - 1}/{total}"
+        else:
+            content_range = f"bytes */{total}"
+        resp, content = self.http.request(
+            self.session_uri, method='PUT', body=bytes(self._buffer[:nbytes]),
+            headers={'Content-Range': content_range, 'Content-Length': str(nbytes)}
+        )
+        if resp.status in (200, 201):
+            self.offset += nbytes
+            del self._buffer[:nbytes]
+            return json.loads(content)
+        if resp.status != 308:
+            raise IOError(f"Resumable upload failed with HTTP {resp.status}")
+        
+        # 308 Resume Incomplete: GCS may have kept less than we sent, resend the rest.
+        # No Range header means none of this request was persisted.
+        if 'range' in resp:
+            persisted = int(resp['range'].rsplit('-', 1)[1]) + 1
+            del self._buffer[:persisted - self.offset]
+            self.offset = persisted
+        return None
+
+
 class CloudStorage:
     def __init__(self):
         self.service = None
+        self.credentials = None  # service account credentials, used to sign URLs
+        self.api_key = None
         self.bucket_name = 'b-transfer-files'
         self._authenticate()
     
+    @property
+    def bucket(self):
+        return self.bucket_name or 'b-transfer-files'
+    
     def _authenticate(self):
         """Authenticate with Google Cloud Storage API"""
         try:
+            import pickle
+            from google_auth_oauthlib.flow import InstalledAppFlow
+            from google.auth.transport.requests import Request
+            from googleapiclient.discovery import build
+            
+            # Local GCS emulator (fake-gcs-server etc.) for development and testing
+            emulator_host = os.environ.get('STORAGE_EMULATOR_HOST')
+            if emulator_host:
+                from google.auth.credentials import AnonymousCredentials
+                self.service = build('storage', 'v1', credentials=AnonymousCredentials(),
+                                     client_options={'api_endpoint': emulator_host.rstrip('/') + '/storage/v1/'})
+                print(f"🧪 Using Google Cloud Storage emulator at {emulator_host}")
+                self._ensure_bucket()
+                return
+            
             # Try API key first (for public access)
             api_key = os.environ.get('GOOGLE_API_KEY')
             if api_key:
                 self.service = build('storage', 'v1', developerKey=api_key)
+                self.api_key = api_key
                 print("🔑 Using Google Cloud Storage API key authentication")
                 self._ensure_bucket()
                 return
@@ -74,6 +153,7 @@ class CloudStorage:
                     pickle.dump(creds, token)
             
             self.service = build('storage', 'v1', credentials=creds)
+            self.credentials = creds
             print("🔐 Using Google Cloud Storage service account authentication")
             self._ensure_bucket()
             
@@ -113,6 +193,8 @@ class CloudStorage:
             if not self.service:
                 return None
             
+            from googleapiclient.http import MediaIoBaseUpload, MediaFileUpload
+            
             # Prepare file metadata
             media_body = None
             
@@ -123,7 +205,7 @@ class CloudStorage:
                     resumable=True
                 )
             else:
-                media_body = MediaIoBaseUpload(
+                media_body = MediaFileUpload(
                     file_path,
                     mimetype='application/octet-stream',
                     resumable=True
@@ -150,19 +232,55 @@ class CloudStorage:
             return {
                 'id': response.get('id'),
                 'name': response.get('name'),
-                'size': response.get('size', 0)
+                'size': response.get('size', 0),
+                'md5Hash': response.get('md5Hash')
             }
             
         except Exception as e:
             print(f"❌ Cloud storage upload failed: {e}")
             return None
     
+    def start_resumable_upload(self, name):
+        """Open a resumable upload session for streaming an object of unknown size"""
+        try:
+            if not self.service:
+                return None
+            
+            root = os.environ.get('STORAGE_EMULATOR_HOST', 'https://storage.googleapis.com').rstrip('/')
+            uri = f"{root}/upload/storage/v1/b/{quote(self.bucket, safe='')}/o?uploadType=resumable&name={quote(name, safe='')}"
+            if self.api_key:
+                uri += f"&key={self.api_key}"
+            
+            # The API client's authorized transport (googleapiclient disables 308 redirects on it)
+            http = self.service._http
+            resp, _ = http.request(uri, method='POST', body='{}',
+                                   headers={'Content-Type': 'application/json; charset=UTF-8'})
+            if resp.status != 200 or 'location' not in resp:
+                raise IOError(f"HTTP {resp.status}")
+            return ResumableUpload(http, resp['location'])
+            
+        except Exception as e:
+            print(f"❌ Cloud storage resumable upload failed to start: {e}")
+            return None
+    
+    def get_object(self, name):
+        """Object metadata (size, md5Hash, ...) or None if it doesn't exist"""
+        try:
+            if not self.service:
+                return None
+            return self.service.objects().get(bucket=self.bucket, object=name).execute()
+        except Exception as e:
+            print(f"⚠️ Cloud storage lookup failed for {name}: {e}")
+            return None
+    
     def download_file(self, file_id):
         """Download file from Google Cloud Storage"""
         try:
             if not self.service:
                 return None
             
+            from googleapiclient.http import MediaIoBaseDownload
+            
             # Get file metadata
             if self.bucket_name:
                 file = self.service.objects().get(bucket=self.bucket_name, object=file_id).execute()
@@ -209,18 +327,46 @@ class CloudStorage:
             print(f"❌ Cloud storage delete failed: {e}")
             return False
     
+    def iter_objects(self, page_size=1000, fields=None):
+        """Every object in the bucket in name order, fetched a page at a time; raises on failure
+
+        `fields` (e.g. 'name,size') trims each listed object to what the caller needs.
+        """
+        options = {'fields': f'items({fields}),nextPageToken'} if fields else {}
+        page_token = None
+        while True:
+            results = self.service.objects().list(
+                bucket=self.bucket, maxResults=page_size, pageToken=page_token, **options
+            ).execute()
+            yield from results.get('items', [])
+            page_token = results.get('nextPageToken')
+            if not page_token:
+                return
+    
+    def delete_objects(self, names):
+        """Delete up to 100 objects in one batch request; returns the names that failed"""
+        from googleapiclient.errors import HttpError
+        
+        failed = []
+        
+        def deleted(request_id, response, exception):
+            # Already gone is as good as deleted
+            if exception is not None and not (isinstance(exception, HttpError) and exception.resp.status == 404):
+                failed.append(names[int(request_id)])
+        
+        batch = self.service.new_batch_http_request(callback=deleted)
+        for i, name in enumerate(names):
+            batch.add(self.service.objects().delete(bucket=self.bucket, object=name), request_id=str(i))
+        batch.execute()
+        return failed
+    
     def list_files(self):
         """List all files in B-Transfer bucket"""
         try:
             if not self.service:
                 return []
             
-            if self.bucket_name:
-                results = self.service.objects().list(bucket=self.bucket_name).execute()
-            else:
-                results = self.service.objects().list(bucket='b-transfer-files').execute()
-            
-            return results.get('items', [])
+            return list(self.iter_objects())
             
         except Exception as e:
             print(f"❌ Cloud storage list failed: {e}")
@@ -0,0 +1,148 @@
+#!/usr/bin/env python3
+"""
+At-Rest Compression for B-Transfer
+Streaming gzip/zstd compression for compressible upload types
+"""
+
+import functools
+import gzip
+import importlib.util
+import threading
+import zlib
+
+# Types that are usually stored uncompressed (zip-based office formats, media
+# and archives are already compressed and are never probed)
+COMPRESSIBLE_EXTENSIONS = {'txt', 'csv', 'doc', 'xls', 'ppt', 'wav'}
+PROBE_SAMPLE_SIZE = 64 * 1024
+PROBE_MAX_RATIO = 0.85  # compress only if the sample shrinks by at least 15%
+CHUNK_SIZE = 1024 * 1024
+
+_stats_lock = threading.Lock()
+_stats = {
+    'files_compressed': 0,
+    'files_skipped': 0,
+    'bytes_in': 0,
+    'bytes_stored': 0
+}
+
+
+def _zstandard():
+    """Import the optional zstandard package on first use"""
+    import zstandard
+    return zstandard
+
+
+@functools.lru_cache(maxsize=None)
+def available_codecs():
+    return ('zstd', 'gzip') if importlib.util.find_spec('zstandard') else ('gzip',)
+
+
+def choose_encoding(filename, stream, codec='gzip'):
+    """Decide per file whether to compress; `stream` is rewound after probing"""
+    if codec not in available_codecs():
+        codec = 'gzip'
+    ext = filename.rsplit('.', 1)[-1].lower() if '.' in filename else ''
+    if ext not in COMPRESSIBLE_EXTENSIONS:
+        return None
+
+    position = stream.tell()
+    sample = stream.read(PROBE_SAMPLE_SIZE)
+    stream.seek(position)
+    if not sample:
+        return None
+
+    ratio = len(zlib.compress(sample, 1)) / len(sample)
+    if ratio > PROBE_MAX_RATIO:
+        _record(skipped=True)
+        return None
+    return codec
+
+
+def compress_stream(src, dst, encoding):
+    """Compress `src` into `dst` chunk by chunk; returns (raw_bytes, stored_bytes)"""
+    raw_bytes = 0
+    start = dst.tell()
+    if encoding == 'zstd':
+        writer = _zstandard().ZstdCompressor(level=3).stream_writer(dst, closefd=False)
+    else:
+        writer = gzip.GzipFile(fileobj=dst, mode='wb', compresslevel=6, mtime=0)
+    with writer:
+        while True:
+            chunk = src.read(CHUNK_SIZE)
+            if not chunk:
+                break
+            writer.write(chunk)
+            raw_bytes += len(chunk)
+    stored_bytes = dst.tell() - start
+    _record(raw_bytes, stored_bytes)
+    return raw_bytes, stored_bytes
+
+
+def decompress_chunks(fileobj, encoding):
+    """Yield decompressed chunks from a stored file object, closing it at the end"""
+    try:
+        if encoding == 'zstd':
+            reader = _zstandard().ZstdDecompressor().stream_reader(fileobj)
+        else:
+            reader = gzip.GzipFile(fileobj=fileobj, mode='rb')
+        with reader:
+            while True:
+                chunk = reader.read(CHUNK_SIZE)
+                if not chunk:
+                    break
+                yield chunk
+    finally:
+        fileobj.close()
+
+
+def _encoding_preferences(accept_encoding):
+    """Map each coding in an Accept-Encoding header to its q-value"""
+    preferences = {}
+    for item in (accept_encoding or '').split(','):
+        parts = item.strip().split(';')
+        coding = parts[0].strip().lower()
+        if not coding:
+            continue
+        q = 1.0
+        for param in parts[1:]:
+            key, _, value = param.strip().partition('=')
+            if key.strip().lower() == 'q':
+                try:
+                    q = float(value)
+                except ValueError:
+                    q = 0.0
+        # x-gzip is an alias of gzip (RFC 9110 section 8.4.1.3)
+        preferences['gzip' if coding == 'x-gzip' else coding] = q
+    return preferences
+
+
+def accepts_encoding(accept_encoding, encoding):
+    """Check an Accept-Encoding header for `encoding` per RFC 9110 section 12.5.3
+
+    `*` stands for every coding not listed and q=0 refuses. A client that
+    refuses identity without refusing `encoding` gets the encoded bytes too.
+    """
+    preferences = _encoding_preferences(accept_encoding)
+    q = preferences.get(encoding, preferences.get('*'))
+    if q is not None:
+        return q > 0
+    return preferences.get('identity') == 0
+
+
+def _record(raw_bytes=0, stored_bytes=0, skipped=False):
+    with _stats_lock:
+        if skipped:
+            _stats['files_skipped'] += 1
+        else:
+            _stats['files_compressed'] += 1
+            _stats['bytes_in'] += raw_bytes
+            _stats['bytes_stored'] += stored_bytes
+
+
+def compression_stats():
+    with _stats_lock:
+        stats = dict(_stats)
+    stats['bytes_saved'] = stats['bytes_in'] - stats['bytes_stored']
+    stats['ratio'] = round(stats['bytes_stored'] / stats['bytes_in'], 3) if stats['bytes_in'] else None
+    stats['codecs'] = list(available_codecs())
+    return stats
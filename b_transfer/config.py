@@ -0,0 +1,84 @@
+#!/usr/bin/env python3
+"""
+Configuration for B-Transfer
+Security limits, storage settings and deployment profiles
+"""
+
+import os
+
+VERSION = '2.1.0'
+SERVICE_NAME = 'B-Transfer by Balsim Technologies'
+
+# Security settings
+MAX_CONTENT_LENGTH = 10 * 1024 * 1024 * 1024  # 10GB limit
+MAX_UPLOADS_PER_SESSION = 50
+MAX_FILE_SIZE_PER_UPLOAD = 5 * 1024 * 1024 * 1024  # 5GB
+ALLOWED_EXTENSIONS = {
+    'txt', 'pdf', 'png', 'jpg', 'jpeg', 'gif', 'mp4', 'avi', 'mov', 'mp3', 'wav',
+    'zip', 'rar', '7z', 'doc', 'docx', 'xls', 'xlsx', 'ppt', 'pptx', 'csv'
+}
+FILE_LIFETIME = 86400  # 24 hours
+
+# Storage settings
+CLOUD_STORAGE_THRESHOLD = 100 * 1024 * 1024  # 100MB - use cloud for files > 100MB
+SCRUB_IO_BUDGET = int(os.environ.get('SCRUB_IO_BUDGET', 8 * 1024 * 1024))  # bytes/sec read by the scrubber
+SCRUB_INTERVAL = 6 * 3600  # seconds between scrub passes
+CLEANUP_INTERVAL = 3600  # seconds between expiry sweeps
+RECONCILE_INTERVAL = 6 * 3600  # seconds between bucket vs metadata reconciliation passes
+RECONCILE_GRACE = 3600  # seconds before a new cloud object without metadata counts as an orphan
+RECONCILE_DELETE = os.environ.get('RECONCILE_DELETE') == '1'  # background passes apply changes; off = report only
+UPLOAD_FOLDER_QUOTA = int(os.environ['UPLOAD_FOLDER_QUOTA']) if os.environ.get('UPLOAD_FOLDER_QUOTA') else None  # bytes
+UNKNOWN_UPLOAD_RESERVATION = 100 * 1024 * 1024  # reserved when Content-Length is missing
+COMPRESS_UPLOADS = os.environ.get('COMPRESS_UPLOADS', '1') != '0'  # at-rest compression for txt/csv/doc/...
+COMPRESSION_CODEC = os.environ.get('COMPRESSION_CODEC', 'gzip')  # 'gzip' or 'zstd' (needs zstandard)
+SIGNED_URL_EXPIRATION = int(os.environ.get('SIGNED_URL_EXPIRATION', 900))  # seconds a direct upload/download URL stays valid
+SHARE_FLUSH_INTERVAL = 30  # seconds between persisting share-link download counts
+PREVIEW_SIZE = 256  # thumbnail bounding box in pixels
+PREVIEW_WORKERS = 2  # background preview threads (server profile)
+PREVIEW_CACHE_BUDGET = int(os.environ.get('PREVIEW_CACHE_BUDGET', 256 * 1024 * 1024))  # bytes of cached previews
+EVENT_REPLAY_SIZE = 1000  # recent file events kept for reconnecting /events clients
+EVENT_KEEPALIVE = 15  # seconds between SSE keepalive comments
+EVENT_STREAM_LIFETIME = 300  # seconds before a stream is closed and the client reconnects
+EVENT_STREAMS = os.environ.get('EVENT_STREAMS', 'auto')  # '1' on, '0' off, 'auto' only under threaded servers
+
+# Transfer scheduling (bulk transfers vs small/interactive requests)
+BULK_TRANSFER_THRESHOLD = 8 * 1024 * 1024  # transfers from this size up are scheduled as bulk
+MAX_BULK_TRANSFERS = int(os.environ.get('MAX_BULK_TRANSFERS', 4))  # concurrent bulk transfers, all sessions
+MAX_BULK_PER_SESSION = 2  # concurrent bulk transfers per session
+BULK_QUEUE_TIMEOUT = 10  # seconds a bulk transfer waits for a slot before a 503
+SCHEDULER_QUANTUM = 256 * 1024  # bytes each session may send per round-robin round
+BULK_BANDWIDTH = int(os.environ['BULK_BANDWIDTH']) if os.environ.get('BULK_BANDWIDTH') else None  # bytes/sec shared by bulk transfers
+
+# LAN relay (sender -> receiver without touching disk)
+RELAY_BUFFER_SIZE = int(os.environ.get('RELAY_BUFFER_SIZE', 4 * 1024 * 1024))  # in-memory bytes per stream
+RELAY_MAX_STREAMS = 8  # parallel streams per transfer
+RELAY_MAX_TRANSFERS = 32  # active transfers; bounds relay memory
+RELAY_WAIT_TIMEOUT = 10  # seconds a sender waits for the receiver before spooling to disk
+RELAY_IDLE_TIMEOUT = 60  # seconds without progress before a relayed stream is dropped
+RELAY_TTL = FILE_LIFETIME  # spooled (store-and-forward) streams are kept this long
+
+# Deployment profiles: same code paths, different backends
+PROFILES = {
+    'server': {
+        'data_dir': '.',
+        'security_log': 'security.log',
+        'background_tasks': True,  # cleanup + scrubber threads
+        'commit_interval': 0.002,  # group-commit window for metadata writes
+        'deployment': None,
+        'relay': True,  # needs sender and receiver on the same process
+        'events': True,  # /events server-sent events
+        'scheduler': True,  # bulk transfer slots and per-session fair share
+        'message': 'B-Transfer API is running!'
+    },
+    'serverless': {
+        'data_dir': '/tmp',  # per-instance unless B_TRANSFER_DATA_DIR is a shared mount
+        'security_log': None,  # platform logs (stdout)
+        'background_tasks': False,  # no threads between invocations; expiry is swept inline
+        'commit_interval': 0,  # one request per instance, nothing to batch with
+        'deployment': 'Vercel Serverless',
+        'relay': False,  # requests don't share an instance
+        'events': False,  # no long-lived connections; clients poll /files
+        'scheduler': False,  # one request per instance, nothing to share
+        'message': 'B-Transfer API is running on Vercel!'
+    }
+}
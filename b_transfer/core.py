@@ -0,0 +1,299 @@
+#!/usr/bin/env python3
+"""
+Transfer Core for B-Transfer
+Owns the storage backends and the metadata, eviction and background maintenance services
+"""
+
+import os
+import time
+import threading
+from datetime import datetime, timedelta
+
+from . import config, listing
+from .capacity import CapacityManager
+from .cloud_storage import get_cloud_storage
+from .delta import SIGNATURES_DIR
+from .events import EVENTS_FILE, EventBus
+from .crypto import read_header
+from .file_store import FileStore
+from .header_index import INDEX_FILE, HeaderIndex, record_from_metadata
+from .integrity import verify_file, file_identity
+from .previews import PreviewCache, PreviewPipeline
+from .relay import RelayHub
+from .routing import UploadRouter
+from .scheduler import TransferScheduler
+from .share_tokens import ShareTokens
+from .shared_state import get_data_dir, get_secret_key, get_node_id, is_multi_node
+
+
+class TransferCore:
+    def __init__(self, profile='server'):
+        self.profile = profile
+        self.settings = config.PROFILES[profile]
+        self.multi_node = is_multi_node()
+
+        # Shared data directory: point every worker/node at the same mount to scale out
+        self.data_dir = get_data_dir(self.settings['data_dir'])
+        self.upload_folder = os.path.join(self.data_dir, 'uploads')
+        self.secret_key = get_secret_key(self.data_dir)
+
+        # Crash-safe writes with per-filename locking
+        self.file_store = FileStore(self.upload_folder, commit_interval=self.settings['commit_interval'])
+        
+        # Fixed-size header records (lock state, owner, sizes, salt) shared by every worker via mmap
+        self.headers = HeaderIndex(os.path.join(self.upload_folder, INDEX_FILE))
+
+        # Other nodes' uploads aren't seen as events, so multi-node mode resyncs periodically
+        self.capacity = CapacityManager(self.upload_folder, quota=config.UPLOAD_FOLDER_QUOTA,
+                                        evict=self.evict_for_space,
+                                        resync_interval=300 if self.multi_node else None)
+        
+        # File change feed for /events, shared by every worker through a log in the data dir
+        self.events = EventBus(os.path.join(self.upload_folder, EVENTS_FILE), config.EVENT_REPLAY_SIZE)
+        
+        # Local vs cloud cut-over, retuned per upload from disk pressure and cloud throughput
+        self.upload_router = UploadRouter(self.capacity, config.CLOUD_STORAGE_THRESHOLD)
+        
+        # Share links: stateless verification, download counts flushed in the background
+        # (or on every download when there are no background threads)
+        self.share_tokens = ShareTokens(self.secret_key, self.file_store, get_node_id(),
+                                        config.SHARE_FLUSH_INTERVAL if self.settings['background_tasks'] else 0)
+        
+        # Thumbnails on a worker pool; rendered inline on first request without background threads
+        self.previews = PreviewPipeline(
+            PreviewCache(os.path.join(self.upload_folder, '.previews'), config.PREVIEW_CACHE_BUDGET),
+            config.PREVIEW_SIZE, workers=config.PREVIEW_WORKERS if self.settings['background_tasks'] else 0,
+            file_store=self.file_store, header=self.file_header
+        )
+        
+        # LAN relay registry lives in process memory, so it's off across nodes/serverless
+        self.relay = None
+        if self.settings['relay'] and not self.multi_node:
+            self.relay = RelayHub(os.path.join(self.upload_folder, '.relay'), config.RELAY_BUFFER_SIZE,
+                                  config.RELAY_MAX_STREAMS, config.RELAY_MAX_TRANSFERS, config.RELAY_TTL,
+                                  on_release=self.capacity.release)
+        
+        # Bulk transfer slots and per-session fair share; slots are shared by every worker
+        self.scheduler = None
+        if self.settings['scheduler']:
+            self.scheduler = TransferScheduler(config.MAX_BULK_TRANSFERS, config.MAX_BULK_PER_SESSION,
+                                               config.BULK_TRANSFER_THRESHOLD, config.SCHEDULER_QUANTUM,
+                                               config.BULK_QUEUE_TIMEOUT, rate=config.BULK_BANDWIDTH,
+                                               slot_dir=os.path.join(self.upload_folder, '.scheduler'))
+
+        self._background_lock = threading.Lock()
+        self._background_started = False
+        self._last_sweep = 0
+        self.last_reconcile = None
+
+    def path(self, filename):
+        return os.path.join(self.upload_folder, filename)
+
+    # Metadata
+
+    def save_metadata(self, filename, metadata):
+        """Save file metadata atomically and refresh its header record"""
+        self.file_store.write_json(f"{filename}.meta", metadata)
+        try:
+            self.headers.put(filename, record_from_metadata(metadata, self._meta_identity(filename)))
+        except FileNotFoundError:
+            pass  # removed meanwhile
+
+    def _meta_identity(self, filename):
+        # Size too, as a reused inode can come back with the same mtime
+        stat = os.stat(self.path(f"{filename}.meta"))
+        return stat.st_mtime_ns, stat.st_ino, stat.st_size
+
+    def file_header(self, filename):
+        """Header record of `filename`, rebuilt from its .meta only when missing or stale
+
+        Costs a stat of the .meta instead of reading and parsing it; None if
+        the file has no metadata.
+        """
+        try:
+            identity = self._meta_identity(filename)
+        except FileNotFoundError:
+            return None
+        record = self.headers.get(filename)
+        if record is not None and record.meta_identity == identity:
+            return record
+        
+        metadata = self.load_metadata(filename)
+        if metadata is None:
+            return None
+        salt = None
+        if metadata.get('is_locked') and not metadata.get('kdf_salt'):
+            # Locked before salts were recorded: read just the payload header
+            try:
+                salt = read_header(self.path(filename))[0]
+            except (OSError, ValueError):
+                pass
+        return self.headers.put(filename, record_from_metadata(metadata, identity, salt))
+
+    def load_metadata(self, filename):
+        """Load file metadata"""
+        return self.file_store.read_json(f"{filename}.meta")
+
+    def publish(self, event_type, filename, metadata=None):
+        """Tell /events subscribers about a file change, with the size /files would show"""
+        if not self.settings['events']:
+            return
+        size = None
+        if metadata is not None:
+            size = listing.metadata_size(metadata)
+            if size is None:
+                try:
+                    size = os.path.getsize(self.path(filename))
+                except OSError:
+                    size = metadata.get('size', 0)
+        self.events.publish(event_type, filename, metadata, size)
+    
+    def remove_local(self, filename):
+        """Remove a file and its metadata; caller holds the file lock"""
+        self.file_store.remove(filename)
+        self.file_store.remove(f"{filename}.meta")
+        self.file_store.forget(filename)
+        self.headers.remove(filename)
+        self.capacity.record_remove(filename)
+
+    # Eviction and expiry
+
+    def evict_for_space(self, filename):
+        """Capacity eviction callback: delete an expired or unlocked local file"""
+        with self.file_store.lock(filename):
+            metadata = self.load_metadata(filename)
+            # No .meta yet: an upload still being written (or its name reservation)
+            # that a rescan picked up; sweep_expired removes it if it's abandoned
+            if not metadata or metadata.get('storage_type') == 'cloud':
+                return False
+            age = datetime.now() - datetime.fromisoformat(metadata['upload_time'])
+            if metadata.get('is_locked') and age <= timedelta(seconds=config.FILE_LIFETIME):
+                return False
+            self.remove_local(filename)
+        self.publish('expire', filename)
+        return True
+
+    def sweep_expired(self):
+        """Delete files older than 24 hours (one pass)"""
+        now = time.time()
+        self._last_sweep = now
+        for entry in os.scandir(self.upload_folder):
+            filename = entry.name
+            if not entry.is_file() or filename.startswith('.') or filename.endswith('.meta'):
+                continue
+            try:
+                file_age = now - entry.stat().st_ctime
+            except FileNotFoundError:
+                continue
+            if file_age > config.FILE_LIFETIME:
+                with self.file_store.lock(filename):
+                    # Only cloud files need anything from the .meta
+                    header = self.file_header(filename)
+                    metadata = self.load_metadata(filename) if header and header.is_cloud else None
+                    self.remove_local(filename)
+                # Leaving the object behind would orphan it; reconciliation retries failed deletes
+                if metadata and metadata.get('storage_type') == 'cloud' and metadata.get('cloud_file_id'):
+                    cloud_storage = get_cloud_storage()
+                    if cloud_storage:
+                        cloud_storage.delete_file(metadata['cloud_file_id'])
+                self.publish('expire', filename)
+                print(f"🗑️ Auto-deleted: {filename}")
+        
+        # Cached delta signatures are useless once the files they describe have expired
+        signatures = os.path.join(self.upload_folder, SIGNATURES_DIR)
+        if os.path.isdir(signatures):
+            for entry in os.scandir(signatures):
+                try:
+                    if now - entry.stat().st_mtime > config.FILE_LIFETIME:
+                        os.remove(entry.path)
+                except FileNotFoundError:
+                    pass
+        
+        # Lock files of deleted names and idle name counters
+        self.file_store.prune(config.FILE_LIFETIME)
+        
+        if self.relay:
+            self.relay.expire()
+
+    def maybe_sweep_expired(self):
+        """Inline expiry for profiles without background threads"""
+        if time.time() - self._last_sweep > config.CLEANUP_INTERVAL:
+            self.sweep_expired()
+
+    # Integrity scrubbing
+
+    def scrub_once(self):
+        """Re-verify every local file against its manifest at the configured IO budget"""
+        for meta_name in os.listdir(self.upload_folder):
+            if not meta_name.endswith('.meta'):
+                continue
+            filename = meta_name[:-len('.meta')]
+            metadata = self.load_metadata(filename)
+            if not metadata or metadata.get('storage_type') == 'cloud' or 'manifest' not in metadata:
+                continue
+
+            filepath = self.path(filename)
+            try:
+                identity = file_identity(filepath)
+                bad_chunk = verify_file(filepath, metadata['manifest'], config.SCRUB_IO_BUDGET)
+            except FileNotFoundError:
+                continue
+
+            with self.file_store.lock(filename):
+                current = self.load_metadata(filename)
+                # Skip files replaced (locked/unlocked/deleted) while we were reading
+                if not current or current.get('manifest') != metadata['manifest'] \
+                        or not os.path.exists(filepath) or file_identity(filepath) != identity:
+                    continue
+                current['verified_at'] = datetime.now().isoformat()
+                current['corrupt_chunk'] = bad_chunk if bad_chunk >= 0 else None
+                self.save_metadata(filename, current)
+
+            if bad_chunk >= 0:
+                print(f"⚠️ Integrity check failed: {filename} (chunk {bad_chunk})")
+
+    # Cloud reconciliation
+
+    def reconcile_cloud(self, dry_run=None):
+        """Delete orphaned cloud objects and drop metadata whose object is gone (one pass)
+
+        Only reports unless RECONCILE_DELETE is set: the bucket may be shared
+        with other deployments, whose objects have no metadata here.
+        """
+        from .reconcile import reconcile  # also run as `python -m b_transfer.reconcile`
+        
+        if dry_run is None:
+            dry_run = not config.RECONCILE_DELETE
+        cloud_storage = get_cloud_storage()
+        if not cloud_storage or not cloud_storage.service:
+            return None
+        self.last_reconcile = reconcile(self, cloud_storage, dry_run=dry_run)
+        return self.last_reconcile
+
+    # Background threads
+
+    def start_background_tasks(self):
+        """Start cleanup, scrubber, share-counter and reconciliation threads once; never at import time"""
+        if self._background_started or not self.settings['background_tasks']:
+            return
+        with self._background_lock:
+            if self._background_started:
+                return
+            self._background_started = True
+        threading.Thread(target=self._run_every, args=(self.sweep_expired, config.CLEANUP_INTERVAL, 'Cleaner'),
+                         daemon=True).start()
+        threading.Thread(target=self._run_every, args=(self.scrub_once, config.SCRUB_INTERVAL, 'Scrubber'),
+                         daemon=True).start()
+        threading.Thread(target=self._run_every,
+                         args=(self.share_tokens.flush, config.SHARE_FLUSH_INTERVAL, 'Share counter'),
+                         daemon=True).start()
+        threading.Thread(target=self._run_every, args=(self.reconcile_cloud, config.RECONCILE_INTERVAL, 'Reconciler'),
+                         daemon=True).start()
+
+    def _run_every(self, task, interval, label):
+        while True:
+            try:
+                task()
+            except Exception as e:
+                print(f"⚠️ {label} error: {e}")
+            time.sleep(interval)
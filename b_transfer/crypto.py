@@ -0,0 +1,170 @@
+#!/usr/bin/env python3
+"""
+File Encryption for B-Transfer
+Military-grade AES-256 file locking (cryptography is imported on first use)
+"""
+
+import io
+import os
+
+from .integrity import read_full
+
+# Locked file layout: salt (16) | iv (16) | HMAC-SHA256 (32) | AES-256-CBC ciphertext
+FORMAT_VERSION = 1
+SALT_SIZE = 16
+HEADER_SIZE = 64
+CHUNK_SIZE = 1024 * 1024  # multiple of the AES block size
+
+
+def derive_key(password, salt):
+    """Derive a key from password using PBKDF2"""
+    from cryptography.hazmat.primitives import hashes
+    from cryptography.hazmat.primitives.kdf.pbkdf2 import PBKDF2HMAC
+    from cryptography.hazmat.backends import default_backend
+    
+    kdf = PBKDF2HMAC(
+        algorithm=hashes.SHA256(),
+        length=32,
+        salt=salt,
+        iterations=100000,
+        backend=default_backend()
+    )
+    return kdf.derive(password.encode())
+
+
+def read_header(path):
+    """Salt, IV and MAC of a locked file, reading only its 64-byte header"""
+    with open(path, 'rb') as f:
+        header = f.read(HEADER_SIZE)
+    if len(header) < HEADER_SIZE:
+        raise ValueError("Invalid encrypted data")
+    return header[:16], header[16:32], header[32:64]
+
+
+def encrypt_stream(src, dst, password, chunk_size=CHUNK_SIZE, hasher=None):
+    """Encrypt `src` into seekable `dst` with military-grade AES-256; returns the salt
+
+    Works through one preallocated input and output buffer (readinto +
+    update_into), so memory stays at about two chunks whatever the file size.
+    The MAC is written into the header once the ciphertext is done; `hasher`
+    is fed everything written, so it sees a zeroed MAC.
+    """
+    from cryptography.hazmat.primitives.ciphers import Cipher, algorithms, modes
+    from cryptography.hazmat.primitives import hashes, hmac
+    from cryptography.hazmat.backends import default_backend
+    
+    salt = os.urandom(SALT_SIZE)
+    key = derive_key(password, salt)
+    iv = os.urandom(16)
+    encryptor = Cipher(algorithms.AES(key), modes.CBC(iv), backend=default_backend()).encryptor()
+    h = hmac.HMAC(key, hashes.SHA256(), backend=default_backend())
+    h.update(iv)
+    
+    start = dst.tell()
+    placeholder = salt + iv + bytes(32)
+    dst.write(placeholder)
+    if hasher:
+        hasher.update(placeholder)
+    
+    # Room for a padding block after a short final chunk
+    buffer = bytearray(chunk_size + 16)
+    out = bytearray(chunk_size + 32)
+    view, out_view = memoryview(buffer), memoryview(out)
+    while True:
+        n = read_full(src, view[:chunk_size])
+        final = n < chunk_size
+        if final:
+            # Pad to a 16-byte boundary (a whole block when already aligned)
+            padding_length = 16 - n % 16
+            view[n:n + padding_length] = bytes([padding_length]) * padding_length
+            n += padding_length
+        written = encryptor.update_into(view[:n], out)
+        h.update(out_view[:written])
+        if hasher:
+            hasher.update(out_view[:written])
+        dst.write(out_view[:written])
+        if final:
+            break
+    encryptor.finalize()
+    
+    end = dst.tell()
+    dst.seek(start + 32)
+    dst.write(h.finalize())
+    dst.seek(end)
+    return salt
+
+
+def decrypt_stream(src, dst, password, chunk_size=CHUNK_SIZE):
+    """Decrypt a locked file from `src` into `dst`; raises ValueError on a bad password or data
+
+    The MAC only checks out after the last chunk, so `dst` should be a
+    staging file that is thrown away when this raises.
+    """
+    from cryptography.hazmat.primitives.ciphers import Cipher, algorithms, modes
+    from cryptography.hazmat.primitives import hashes, hmac
+    from cryptography.hazmat.backends import default_backend
+    
+    header = src.read(HEADER_SIZE)
+    if len(header) < HEADER_SIZE:
+        raise ValueError("Invalid encrypted data")
+    salt, iv, mac = header[:16], header[16:32], header[32:64]
+    
+    key = derive_key(password, salt)
+    decryptor = Cipher(algorithms.AES(key), modes.CBC(iv), backend=default_backend()).decryptor()
+    h = hmac.HMAC(key, hashes.SHA256(), backend=default_backend())
+    h.update(iv)
+    
+    buffer = bytearray(chunk_size)
+    out = bytearray(chunk_size + 16)
+    view, out_view = memoryview(buffer), memoryview(out)
+    pending = 0  # last decrypted block, held back until we know it carries the padding
+    while True:
+        n = read_full(src, view)
+        if n % 16:
+            raise ValueError("Invalid encrypted data")
+        final = n < chunk_size
+        h.update(view[:n])
+        if final:
+            try:
+                h.verify(mac)
+            except Exception:
+                raise ValueError("Invalid password or corrupted data")
+        if pending and n:
+            dst.write(out_view[chunk_size - 16:chunk_size])
+            pending = 0
+        written = decryptor.update_into(view[:n], out)
+        if final:
+            break
+        # Keep the last block back in case the next read is EOF
+        dst.write(out_view[:written - 16])
+        pending = 16
+    decryptor.finalize()
+    
+    if written:
+        padding_length = out[written - 1]
+        if not 1 <= padding_length <= 16:
+            raise ValueError("Invalid password or corrupted data")
+        dst.write(out_view[:written - padding_length])
+    elif pending:
+        padding_length = out[chunk_size - 1]
+        if not 1 <= padding_length <= 16:
+            raise ValueError("Invalid password or corrupted data")
+        dst.write(out_view[chunk_size - 16:chunk_size - padding_length])
+    else:
+        raise ValueError("Invalid encrypted data")
+
+
+def encrypt_file(file_data, password):
+    """Encrypt file data with military-grade AES-256"""
+    dst = io.BytesIO()
+    encrypt_stream(io.BytesIO(file_data), dst, password)
+    return dst.getvalue()
+
+
+def decrypt_file(encrypted_data, password):
+    """Decrypt file data with military-grade AES-256"""
+    if len(encrypted_data) < 80:  # Minimum size check
+        raise ValueError("Invalid encrypted data")
+    dst = io.BytesIO()
+    decrypt_stream(io.BytesIO(encrypted_data), dst, password)
+    return dst.getvalue()
@@ -0,0 +1,218 @@
+#!/usr/bin/env python3
+"""
+Event Bus for B-Transfer
+Feed of file changes appended to a log in the data directory, so every
+worker process sees every event and clients follow /events instead of
+re-polling /files
+"""
+
+import os
+import json
+import time
+import secrets
+import threading
+from contextlib import contextmanager
+from collections import namedtuple
+
+try:
+    import fcntl
+except ImportError:  # Windows - single process only
+    fcntl = None
+
+EVENTS_FILE = '.events.log'
+EVENT_BYTES = 512  # log space budgeted per event of the replay size
+READ_SIZE = 256 * 1024
+
+Event = namedtuple('Event', ['epoch', 'seq', 'type', 'filename', 'metadata', 'size', 'time'])
+
+
+class EventBus:
+    """Sequenced events shared through an append-only log
+
+    Ids are '<epoch>-<offset>': the log's generation and the byte offset just
+    past the event. Appends take a shared flock; once the log outgrows
+    `replay_size` events it is replaced by an empty one under an exclusive
+    flock. The new generation records where the old one ended, so clients
+    that had read all of it carry on and only those further behind get a
+    reset.
+    Subscribers poll the log every `poll_interval` seconds for other
+    processes' events and are woken at once for their own.
+    """
+
+    def __init__(self, path, replay_size=1000, poll_interval=0.5):
+        self.path = path
+        self.replay_size = replay_size
+        self.max_bytes = replay_size * EVENT_BYTES
+        self.poll_interval = poll_interval
+        self._cond = threading.Condition()
+        self._fd = None
+        self._ino = None
+        self._epoch = None
+        self._start = 0  # offset of the first event, past the header
+        self._prev = None  # (epoch, end) of the generation this one replaced
+
+    # Log file
+
+    def _open(self):
+        """Switch to the current log, creating it if missing; caller holds self._cond"""
+        while True:
+            try:
+                ino = os.stat(self.path).st_ino
+            except FileNotFoundError:
+                self._create(replace=False)
+                continue
+            if ino == self._ino:
+                return
+            if self._fd is not None:
+                os.close(self._fd)
+            self._fd = self._ino = None
+            try:
+                fd = os.open(self.path, os.O_RDWR | os.O_APPEND)
+            except FileNotFoundError:
+                continue
+            if os.fstat(fd).st_ino != ino:
+                os.close(fd)
+                continue
+            self._fd, self._ino = fd, ino
+            header = os.pread(fd, 256, 0).split(b'\n', 1)[0]
+            fields = json.loads(header)
+            self._epoch = fields['epoch']
+            self._start = len(header) + 1
+            self._prev = tuple(fields['prev']) if fields.get('prev') else None
+            return
+
+    def _create(self, replace, prev=None):
+        """Put a new, empty log generation in place; the header is written before it appears"""
+        temp_path = f"{self.path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with open(temp_path, 'wb') as f:
+            f.write(json.dumps({'epoch': secrets.token_hex(4), 'prev': prev}).encode() + b'\n')
+        if replace:
+            os.replace(temp_path, self.path)
+            return
+        try:
+            os.link(temp_path, self.path)
+        except FileExistsError:
+            pass
+        finally:
+            os.remove(temp_path)
+
+    @contextmanager
+    def _flocked(self, exclusive):
+        if fcntl is None:
+            yield
+            return
+        fcntl.flock(self._fd, fcntl.LOCK_EX if exclusive else fcntl.LOCK_SH)
+        try:
+            yield
+        finally:
+            fcntl.flock(self._fd, fcntl.LOCK_UN)
+
+    # Publishing
+
+    def publish(self, event_type, filename, metadata=None, size=None):
+        # Drop bulky fields subscribers never see
+        if metadata is not None:
+            metadata = {k: metadata.get(k) for k in ('session_id', 'is_locked', 'storage_type', 'sha256')}
+        line = json.dumps({'type': event_type, 'filename': filename, 'metadata': metadata,
+                           'size': size, 'time': time.time()}).encode() + b'\n'
+        with self._cond:
+            written = False
+            while not written:
+                self._open()
+                with self._flocked(exclusive=False):
+                    # Rotated between the stat and the flock: append to the new log instead
+                    if self._is_current():
+                        os.write(self._fd, line)
+                        written = True
+                    else:
+                        self._ino = None
+                full = written and os.fstat(self._fd).st_size > self.max_bytes
+            if full:
+                self._rotate()
+            self._cond.notify_all()
+
+    def _rotate(self):
+        """Start a new generation once the log is over budget; caller holds self._cond"""
+        with self._flocked(exclusive=True):
+            end = os.fstat(self._fd).st_size
+            if self._is_current() and end > self.max_bytes:
+                self._create(replace=True, prev=(self._epoch, end))
+
+    def _is_current(self):
+        try:
+            return os.stat(self.path).st_ino == self._ino
+        except FileNotFoundError:
+            return False
+
+    # Subscribing
+
+    def event_id(self, event):
+        return f"{event.epoch}-{event.seq}"
+
+    def cursor_id(self, cursor):
+        return f"{cursor[0]}-{cursor[1]}"
+
+    def current(self):
+        """Cursor at the end of the log: (epoch, offset)"""
+        with self._cond:
+            self._open()
+            return self._epoch, os.fstat(self._fd).st_size
+
+    def resume_point(self, last_event_id):
+        """Cursor to resume after, or None if the client must reload the full listing"""
+        if not last_event_id:
+            return self.current()
+        epoch, _, seq = last_event_id.partition('-')
+        if not seq.isdigit():
+            return None
+        with self._cond:
+            self._open()
+            if self._prev == (epoch, int(seq)):
+                return self._epoch, self._start
+            # Older generation, or not the end of an event in this one
+            if epoch != self._epoch or int(seq) < self._start or \
+                    os.pread(self._fd, 1, int(seq) - 1) != b'\n':
+                return None
+            return epoch, int(seq)
+
+    def wait(self, cursor, timeout):
+        """Events after `cursor`, blocking up to `timeout` for the first one; None if the log rotated past it"""
+        deadline = time.monotonic() + timeout
+        with self._cond:
+            while True:
+                events = self._read(cursor)
+                remaining = deadline - time.monotonic()
+                if events is None or events or remaining <= 0:
+                    return events
+                self._cond.wait(min(self.poll_interval, remaining))
+
+    def _read(self, cursor):
+        """Complete events after `cursor`, or None if it is in a generation already gone; caller holds self._cond"""
+        epoch, offset = cursor
+        # Finish the generation we have open, even if it has just been replaced
+        if epoch == self._epoch:
+            events = self._read_at(epoch, offset)
+            if events:
+                return events
+        self._open()
+        if epoch == self._epoch:
+            return self._read_at(epoch, offset)
+        if self._prev == (epoch, offset):
+            return self._read_at(self._epoch, self._start)
+        return None
+
+    def _read_at(self, epoch, offset):
+        data = os.pread(self._fd, READ_SIZE, offset)
+        # A line still being written is picked up on the next read
+        data = data[:data.rfind(b'\n') + 1]
+        events = []
+        for line in data.splitlines(keepends=True):
+            offset += len(line)
+            record = json.loads(line)
+            events.append(Event(epoch, offset, record['type'], record['filename'], record['metadata'],
+                                record['size'], record['time']))
+        return events
+
+    def stats(self):
+        epoch, end = self.current()
+        return {'last_event': self.cursor_id((epoch, end)), 'log_bytes': end, 'replay_size': self.replay_size}
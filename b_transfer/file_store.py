@@ -0,0 +1,359 @@
+#!/usr/bin/env python3
+"""
+Transactional File Store for B-Transfer
+Crash-safe writes (temp file + rename) with per-filename locks and group commit:
+small writes that arrive together share one filesystem sync, large ones commit
+on their own so they never hold the small ones up
+"""
+
+import os
+import json
+import time
+import threading
+from contextlib import contextmanager
+
+try:
+    import fcntl
+except ImportError:  # Windows - thread locks only
+    fcntl = None
+
+STAGING_DIR = '.staging'
+LOCKS_DIR = '.locks'
+NAMES_DIR = '.names'
+INLINE_COMMIT_SIZE = 1024 * 1024  # writes from this size up skip the group commit
+STALE_STAGING_AGE = 3600  # seconds untouched before a staging file counts as left by a crash
+
+_libc = None
+
+
+class _NameLock:
+    """Thread lock for one name, plus the flocked fd while a thread holds it"""
+
+    def __init__(self):
+        self.lock = threading.RLock()
+        self.users = 0  # threads holding or waiting
+        self.depth = 0  # re-entrant acquires by the holder
+        self.fd = None
+
+
+class _Batch:
+    """A group of staged writes that share one commit"""
+
+    def __init__(self):
+        self.entries = []
+        self.errors = {}
+        self.done = threading.Event()
+
+
+class FileStore:
+    def __init__(self, root, commit_interval=0.002, max_batch=128):
+        self.root = root
+        self.staging = os.path.join(root, STAGING_DIR)
+        self.locks = os.path.join(root, LOCKS_DIR)
+        self.names = os.path.join(root, NAMES_DIR)
+        self.commit_interval = commit_interval
+        self.max_batch = max_batch
+
+        self._mutex = threading.Lock()
+        self._name_locks = {}
+        self._cond = threading.Condition()
+        self._pending = _Batch()
+        self._committer = None
+
+        for path in (self.root, self.staging, self.locks, self.names):
+            os.makedirs(path, exist_ok=True)
+
+    def path(self, name):
+        return os.path.join(self.root, name)
+
+    # Per-filename locking (threads + processes)
+
+    @contextmanager
+    def lock(self, name):
+        """Hold an exclusive lock on `name` across threads and worker processes
+
+        Re-entrant within a thread: nested acquires share the outer flock.
+        """
+        with self._mutex:
+            entry = self._name_locks.setdefault(name, _NameLock())
+            entry.users += 1
+        try:
+            with entry.lock:
+                if entry.depth == 0 and fcntl is not None:
+                    entry.fd = self._flock(name)
+                entry.depth += 1
+                try:
+                    yield
+                finally:
+                    entry.depth -= 1
+                    if entry.depth == 0 and entry.fd is not None:
+                        fcntl.flock(entry.fd, fcntl.LOCK_UN)
+                        os.close(entry.fd)
+                        entry.fd = None
+        finally:
+            with self._mutex:
+                entry.users -= 1
+                if entry.users == 0:
+                    del self._name_locks[name]
+
+    def _flock(self, name):
+        """Open and flock the lock file of `name`
+
+        Lock files are only unlinked by a holder (forget), so a process that
+        was waiting on an unlinked one retries on the current file.
+        """
+        path = os.path.join(self.locks, f"{name}.lock")
+        while True:
+            fd = os.open(path, os.O_RDWR | os.O_CREAT, 0o600)
+            fcntl.flock(fd, fcntl.LOCK_EX)
+            try:
+                if os.fstat(fd).st_ino == os.stat(path).st_ino:
+                    return fd
+            except FileNotFoundError:
+                pass
+            fcntl.flock(fd, fcntl.LOCK_UN)
+            os.close(fd)
+
+    def forget(self, name):
+        """Remove the lock file of a deleted `name`; caller holds lock(name)"""
+        _silent_remove(os.path.join(self.locks, f"{name}.lock"))
+
+    def prune(self, max_age):
+        """Clean up after deleted names, idle name counters and crashed writers
+
+        Removes lock files of names that no longer exist, name counters idle
+        for `max_age` (every name they handed out has expired by then, and a
+        lost counter only costs extra probes anyway) and staging files
+        untouched for STALE_STAGING_AGE.
+        """
+        now = time.time()
+        for entry in os.scandir(self.names):
+            if not entry.name.endswith('.next'):
+                continue
+            lock_name = f"{entry.name[:-len('.next')]}.name"
+            with self.lock(lock_name):
+                try:
+                    if now - os.stat(entry.path).st_mtime > max_age:
+                        os.remove(entry.path)
+                except FileNotFoundError:
+                    pass
+
+        for entry in os.scandir(self.locks):
+            name = entry.name[:-len('.lock')]
+            if not entry.name.endswith('.lock'):
+                continue
+            with self.lock(name):
+                if name.endswith('.name'):
+                    gone = not os.path.exists(os.path.join(self.names, f"{name[:-len('.name')]}.next"))
+                else:
+                    gone = not os.path.exists(self.path(name))
+                if gone:
+                    self.forget(name)
+
+        # Staging files of writers that crashed; live ones are written to all the time
+        for entry in os.scandir(self.staging):
+            try:
+                if now - entry.stat().st_mtime > STALE_STAGING_AGE:
+                    os.remove(entry.path)
+            except FileNotFoundError:
+                pass
+
+    # Unique name allocation
+
+    def allocate_name(self, filename):
+        """Reserve a unique name derived from `filename` with O_EXCL
+
+        The original name is tried first, then `name_N.ext` starting from a
+        per-base-name counter, so popular names don't probe every suffix.
+        The reservation is an empty placeholder file owned by the caller.
+        """
+        if self._reserve(filename):
+            return filename
+
+        name, ext = os.path.splitext(filename)
+        counter_path = os.path.join(self.names, f"{filename}.next")
+        with self.lock(f"{filename}.name"):
+            counter = _read_counter(counter_path)
+            while True:
+                candidate = f"{name}_{counter}{ext}"
+                counter += 1
+                if self._reserve(candidate):
+                    break
+            _write_counter(counter_path, counter)
+        return candidate
+
+    def _reserve(self, name):
+        try:
+            fd = os.open(self.path(name), os.O_WRONLY | os.O_CREAT | os.O_EXCL, 0o644)
+        except FileExistsError:
+            return False
+        os.close(fd)
+        return True
+
+    # Atomic writes
+
+    @contextmanager
+    def atomic_writer(self, name):
+        """Yield a staging file; on success it atomically replaces `name` once durable"""
+        temp_path = os.path.join(self.staging, f"{name}.{os.getpid()}.{threading.get_ident()}.tmp")
+        f = open(temp_path, 'wb')
+        try:
+            yield f
+            f.flush()
+        except BaseException:
+            f.close()
+            _silent_remove(temp_path)
+            raise
+        large = f.tell() >= INLINE_COMMIT_SIZE
+        f.close()
+        if large:
+            self._commit_inline(temp_path, self.path(name))
+        else:
+            self._commit(temp_path, self.path(name))
+
+    def write_bytes(self, name, data):
+        with self.atomic_writer(name) as f:
+            f.write(data)
+
+    def write_json(self, name, obj):
+        with self.atomic_writer(name) as f:
+            f.write(json.dumps(obj).encode())
+
+    def read_json(self, name):
+        try:
+            with open(self.path(name), 'rb') as f:
+                return json.load(f)
+        except FileNotFoundError:
+            return None
+
+    def remove(self, name):
+        """Remove `name` if it exists; returns True when something was deleted"""
+        try:
+            os.remove(self.path(name))
+            return True
+        except FileNotFoundError:
+            return False
+
+    # Group commit
+
+    def _commit_inline(self, temp_path, final_path):
+        try:
+            _fdatasync(temp_path)
+            os.replace(temp_path, final_path)
+        except BaseException:
+            _silent_remove(temp_path)
+            raise
+        _fsync_directory(os.path.dirname(final_path) or '.')
+
+    def _commit(self, temp_path, final_path):
+        with self._cond:
+            if self._committer is None or not self._committer.is_alive():
+                self._committer = threading.Thread(target=self._commit_loop, daemon=True)
+                self._committer.start()
+            batch = self._pending
+            batch.entries.append((temp_path, final_path))
+            self._cond.notify()
+        batch.done.wait()
+        error = batch.errors.get(temp_path)
+        if error:
+            raise error
+
+    def _commit_loop(self):
+        while True:
+            with self._cond:
+                while not self._pending.entries:
+                    self._cond.wait()
+            # Give concurrent writers a moment to join this batch
+            if len(self._pending.entries) < self.max_batch:
+                time.sleep(self.commit_interval)
+            with self._cond:
+                batch, self._pending = self._pending, _Batch()
+            self._flush(batch)
+
+    def _flush(self, batch):
+        # Later writes to the same target supersede earlier ones in the batch
+        latest = {}
+        for temp_path, final_path in batch.entries:
+            superseded = latest.get(final_path)
+            if superseded:
+                _silent_remove(superseded)
+            latest[final_path] = temp_path
+
+        # One syncfs makes the whole batch durable; per-file syncs where it isn't available
+        synced = len(latest) > 1 and _syncfs(self.staging)
+        directories = set()
+        for final_path, temp_path in latest.items():
+            try:
+                if not synced:
+                    _fdatasync(temp_path)
+                os.replace(temp_path, final_path)
+                directories.add(os.path.dirname(final_path) or '.')
+            except Exception as e:
+                batch.errors[temp_path] = e
+                _silent_remove(temp_path)
+
+        # One directory fsync covers every rename in the batch
+        for directory in directories:
+            _fsync_directory(directory)
+        batch.done.set()
+
+
+def _read_counter(path):
+    try:
+        with open(path, 'r') as f:
+            return max(int(f.read() or 1), 1)
+    except (OSError, ValueError):
+        return 1
+
+
+def _write_counter(path, value):
+    # Not fsynced: a lost counter only costs a few extra probes, never a collision
+    with open(path, 'w') as f:
+        f.write(str(value))
+
+
+def _fdatasync(path):
+    fd = os.open(path, os.O_RDONLY)
+    try:
+        (getattr(os, 'fdatasync', None) or os.fsync)(fd)
+    finally:
+        os.close(fd)
+
+
+def _syncfs(path):
+    """syncfs(2) on the filesystem holding `path`; False where the platform lacks it"""
+    global _libc
+    if _libc is None:
+        try:
+            import ctypes  # only once something is committed, keeping imports light
+            _libc = ctypes.CDLL(None, use_errno=True)
+            _libc.syncfs
+        except (OSError, AttributeError):
+            _libc = False
+    if not _libc:
+        return False
+    fd = os.open(path, os.O_RDONLY)
+    try:
+        return _libc.syncfs(fd) == 0
+    finally:
+        os.close(fd)
+
+
+def _fsync_directory(directory):
+    try:
+        fd = os.open(directory, os.O_RDONLY)
+    except OSError:
+        return
+    try:
+        os.fsync(fd)
+    except OSError:
+        pass
+    finally:
+        os.close(fd)
+
+
+def _silent_remove(path):
+    try:
+        os.remove(path)
+    except OSError:
+        pass
@@ -0,0 +1,331 @@
+#!/usr/bin/env python3
+"""
+Header Index for B-Transfer
+Fixed-size per-file records (lock state, owner, sizes, KDF salt, hash) in a
+memory-mapped hash table, so listings and lock decisions skip the .meta JSON
+and the encrypted payload
+
+Records are a cache of the .meta files. Each carries the identity of the
+.meta it was built from and a CRC, and callers refresh it lazily when the
+.meta has changed or the record doesn't check out.
+"""
+
+import os
+import mmap
+import zlib
+import struct
+import hashlib
+import threading
+from contextlib import contextmanager
+from collections import namedtuple
+
+from .crypto import FORMAT_VERSION, SALT_SIZE
+
+try:
+    import fcntl
+except ImportError:  # Windows - thread locks only
+    fcntl = None
+
+INDEX_FILE = '.headers.idx'
+MAGIC = b'BTHX'
+INDEX_VERSION = 2
+DEFAULT_CAPACITY = 16384
+MAX_LOAD = 0.7
+
+# magic | version u8 | retired u8 | capacity u32 | used u32 | tombstones u32
+_HEADER = struct.Struct('>4sBBxxIII')
+RETIRED_OFFSET = 5
+# state | payload format | flags | encoding | name key | owner | KDF salt | chunk size |
+# plaintext length | stored length | plaintext sha256 | .meta mtime_ns | .meta inode | .meta size | crc32
+_RECORD = struct.Struct('>BBBB16s8s16sIQQ32sQQQI')
+_CRC_OFFSET = _RECORD.size - 4
+
+EMPTY, USED, TOMBSTONE = 0, 1, 2
+LOCKED, CLOUD, PENDING, CORRUPT = 1, 2, 4, 8
+ENCODINGS = [None, 'gzip', 'zstd']
+
+
+def name_key(filename):
+    return hashlib.blake2b(filename.encode(), digest_size=16).digest()
+
+
+def owner_key(session_id):
+    """8-byte owner field; session ids are 16 hex characters"""
+    if not session_id:
+        return bytes(8)
+    try:
+        if len(session_id) == 16:
+            return bytes.fromhex(session_id)
+    except ValueError:
+        pass
+    return hashlib.blake2b(session_id.encode(), digest_size=8).digest()
+
+
+class HeaderRecord(namedtuple('HeaderRecord', [
+        'version', 'flags', 'encoding', 'owner', 'salt', 'chunk_size',
+        'size', 'stored_size', 'sha256', 'meta_identity'])):
+    __slots__ = ()
+
+    @property
+    def is_locked(self):
+        return bool(self.flags & LOCKED)
+
+    @property
+    def is_cloud(self):
+        return bool(self.flags & CLOUD)
+
+    @property
+    def is_pending(self):
+        return bool(self.flags & PENDING)
+
+    def owned_by(self, session_id):
+        return self.owner != bytes(8) and self.owner == owner_key(session_id)
+
+
+def record_from_metadata(metadata, meta_identity, salt=None):
+    flags = 0
+    if metadata.get('is_locked'):
+        flags |= LOCKED
+    if metadata.get('storage_type') == 'cloud':
+        flags |= CLOUD
+    if metadata.get('status') == 'pending':
+        flags |= PENDING
+    if metadata.get('corrupt_chunk') is not None:
+        flags |= CORRUPT
+    if salt is None and metadata.get('kdf_salt'):
+        salt = bytes.fromhex(metadata['kdf_salt'])
+    sha256 = metadata.get('sha256')
+    return HeaderRecord(
+        version=FORMAT_VERSION if metadata.get('is_locked') else 0,
+        flags=flags,
+        encoding=metadata.get('encoding') if metadata.get('encoding') in ENCODINGS else None,
+        owner=owner_key(metadata.get('session_id')),
+        salt=salt or bytes(SALT_SIZE),
+        chunk_size=metadata.get('manifest', {}).get('chunk_size', 0),
+        size=int(metadata.get('size', 0)),
+        stored_size=int(metadata.get('stored_size', metadata.get('size', 0))),
+        sha256=bytes.fromhex(sha256) if sha256 else bytes(32),
+        meta_identity=meta_identity
+    )
+
+
+def _pack(key, record):
+    body = _RECORD.pack(USED, record.version, record.flags, ENCODINGS.index(record.encoding), key,
+                        record.owner, record.salt, record.chunk_size, record.size, record.stored_size,
+                        record.sha256, *record.meta_identity, 0)
+    return body[:_CRC_OFFSET] + struct.pack('>I', zlib.crc32(body[:_CRC_OFFSET]))
+
+
+def _unpack(mm, offset):
+    """Record at `offset`, or None if it is torn or corrupt"""
+    body = mm[offset:offset + _RECORD.size]
+    fields = _RECORD.unpack(body)
+    if fields[-1] != zlib.crc32(body[:_CRC_OFFSET]) or fields[3] >= len(ENCODINGS):
+        return None
+    _, version, flags, encoding, _, owner, salt, chunk_size, size, stored_size, sha256 = fields[:11]
+    return HeaderRecord(version, flags, ENCODINGS[encoding], owner, salt, chunk_size,
+                        size, stored_size, sha256, fields[11:14])
+
+
+def _offset(slot):
+    return _HEADER.size + slot * _RECORD.size
+
+
+def _counts(mm):
+    return struct.unpack_from('>II', mm, 12)
+
+
+def _set_counts(mm, used, tombstones):
+    struct.pack_into('>II', mm, 12, used, tombstones)
+
+
+def _find(mm, capacity, key):
+    """Linear probe for `key`: (its slot or None, first reusable slot or None)"""
+    start = int.from_bytes(key[:8], 'big') % capacity
+    reusable = None
+    for i in range(capacity):
+        slot = (start + i) % capacity
+        offset = _offset(slot)
+        state = mm[offset]
+        if state == EMPTY:
+            return None, slot if reusable is None else reusable
+        if state == TOMBSTONE:
+            if reusable is None:
+                reusable = slot
+        elif mm[offset + 4:offset + 20] == key:
+            return slot, reusable
+    return None, reusable
+
+
+def _create(path, capacity):
+    """Empty index beside `path`, to be os.replace()d over it; returns (fd, temp path)
+
+    Never built in place: other processes may have the old file mapped, and
+    shrinking it under them would fault their next access.
+    """
+    temp_path = f"{path}.{os.getpid()}.tmp"
+    fd = os.open(temp_path, os.O_RDWR | os.O_CREAT | os.O_TRUNC, 0o600)
+    os.ftruncate(fd, _HEADER.size + capacity * _RECORD.size)
+    os.pwrite(fd, _HEADER.pack(MAGIC, INDEX_VERSION, 0, capacity, 0, 0), 0)
+    return fd, temp_path
+
+
+class HeaderIndex:
+    """Open-addressed hash table of HeaderRecords keyed by filename, shared by every worker
+
+    Writers take an flock on the index file; readers don't and rely on the
+    CRC to skip records caught mid-write. When the table fills up it is
+    rebuilt at twice the size and the old file is marked retired, so other
+    processes remap on their next access.
+    """
+
+    def __init__(self, path, capacity=DEFAULT_CAPACITY):
+        self.path = path
+        self.initial_capacity = capacity
+        self._lock = threading.RLock()
+        self._fd = None
+        self._mm = None
+        self.capacity = 0
+
+    # Mapping
+
+    def _open(self):
+        """Map the current index file; caller holds self._lock"""
+        while self._mm is None or self._mm[RETIRED_OFFSET]:
+            self._close()
+            fd = os.open(self.path, os.O_RDWR | os.O_CREAT, 0o600)
+            with self._flocked(fd):
+                valid = self._is_current(fd)
+                if valid:
+                    size = os.fstat(fd).st_size
+                    header = os.pread(fd, _HEADER.size, 0)
+                    valid = len(header) == _HEADER.size
+                    if valid:
+                        magic, version, _, capacity, _, _ = _HEADER.unpack(header)
+                        valid = magic == MAGIC and version == INDEX_VERSION and \
+                            size == _HEADER.size + capacity * _RECORD.size
+                    if not valid:
+                        # Missing or unreadable: it is only a cache, so swap in an
+                        # empty one and retire this for processes still mapping it
+                        new_fd, temp_path = _create(self.path, self.initial_capacity)
+                        os.close(new_fd)
+                        os.replace(temp_path, self.path)
+                        if size > RETIRED_OFFSET:
+                            os.pwrite(fd, b'\x01', RETIRED_OFFSET)
+            if not valid:
+                os.close(fd)
+                continue
+            self._fd = fd
+            self._mm = mmap.mmap(fd, os.fstat(fd).st_size)
+            self.capacity = _HEADER.unpack_from(self._mm, 0)[3]
+
+    def _is_current(self, fd):
+        """Whether `fd` is still the file at self.path, not one replaced since it was opened"""
+        try:
+            return os.fstat(fd).st_ino == os.stat(self.path).st_ino
+        except FileNotFoundError:
+            return False
+
+    def _close(self):
+        if self._mm is not None:
+            self._mm.close()
+            os.close(self._fd)
+        self._mm = self._fd = None
+
+    @staticmethod
+    @contextmanager
+    def _flocked(fd):
+        if fcntl is None:
+            yield
+            return
+        fcntl.flock(fd, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(fd, fcntl.LOCK_UN)
+
+    @contextmanager
+    def _writing(self):
+        """Exclusive access to the current (non-retired) index across threads and processes"""
+        with self._lock:
+            while True:
+                self._open()
+                with self._flocked(self._fd):
+                    if not self._mm[RETIRED_OFFSET]:
+                        yield
+                        return
+
+    # Lookup
+
+    def get(self, filename):
+        """Record for `filename`, or None if it isn't indexed (or didn't validate)"""
+        with self._lock:
+            self._open()
+            slot, _ = _find(self._mm, self.capacity, name_key(filename))
+            return None if slot is None else _unpack(self._mm, _offset(slot))
+
+    # Updates
+
+    def put(self, filename, record):
+        key = name_key(filename)
+        packed = _pack(key, record)
+        while True:
+            with self._writing():
+                mm = self._mm
+                slot, reusable = _find(mm, self.capacity, key)
+                if slot is None:
+                    used, tombstones = _counts(mm)
+                    if reusable is None or used + tombstones + 1 > self.capacity * MAX_LOAD:
+                        self._rebuild(used)
+                        continue  # retry against the new file
+                    slot = reusable
+                    if mm[_offset(slot)] == TOMBSTONE:
+                        tombstones -= 1
+                    _set_counts(mm, used + 1, tombstones)
+                mm[_offset(slot):_offset(slot) + _RECORD.size] = packed
+            return record
+
+    def remove(self, filename):
+        key = name_key(filename)
+        with self._writing():
+            slot, _ = _find(self._mm, self.capacity, key)
+            if slot is None:
+                return
+            self._mm[_offset(slot)] = TOMBSTONE
+            used, tombstones = _counts(self._mm)
+            _set_counts(self._mm, used - 1, tombstones + 1)
+
+    def _rebuild(self, used):
+        """Rehash valid records into a new file, doubling it when genuinely full; caller is writing
+
+        The old file is marked retired, which sends every process (this one
+        included) to the new file on its next access.
+        """
+        capacity = self.capacity * 2 if used + 1 > self.capacity * MAX_LOAD / 2 else self.capacity
+        fd, temp_path = _create(self.path, capacity)
+        try:
+            with mmap.mmap(fd, os.fstat(fd).st_size) as new:
+                live = 0
+                for slot in range(self.capacity):
+                    offset = _offset(slot)
+                    # Torn or corrupt records are dropped and refreshed from .meta on lookup
+                    if self._mm[offset] != USED or _unpack(self._mm, offset) is None:
+                        continue
+                    body = self._mm[offset:offset + _RECORD.size]
+                    _, target = _find(new, capacity, body[4:20])
+                    new[_offset(target):_offset(target) + _RECORD.size] = body
+                    live += 1
+                _set_counts(new, live, 0)
+                new.flush()
+        finally:
+            os.close(fd)
+        os.replace(temp_path, self.path)
+        self._mm[RETIRED_OFFSET] = 1
+        self._mm.flush()
+
+    def stats(self):
+        with self._lock:
+            self._open()
+            _, _, _, capacity, used, tombstones = _HEADER.unpack_from(self._mm, 0)
+            return {'records': used, 'tombstones': tombstones, 'capacity': capacity,
+                    'bytes': _HEADER.size + capacity * _RECORD.size}
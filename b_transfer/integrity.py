@@ -0,0 +1,182 @@
+#!/usr/bin/env python3
+"""
+Integrity Verification for B-Transfer
+Single-pass SHA-256 + per-chunk manifests, download digests and a rate-limited scrubber
+"""
+
+import os
+import time
+import base64
+import hashlib
+
+MANIFEST_CHUNK_SIZE = 4 * 1024 * 1024  # one manifest entry per 4MB of stored bytes
+COPY_CHUNK_SIZE = 1024 * 1024
+
+
+class IntegrityError(Exception):
+    pass
+
+
+class ChunkHasher:
+    """Whole-content SHA-256 plus a SHA-256 per fixed-size chunk, fed incrementally
+
+    With `whole=False` only the chunks are hashed and the manifest's sha256 is
+    None, for content patched after it was written (locked files' MAC).
+    """
+
+    def __init__(self, chunk_size=MANIFEST_CHUNK_SIZE, md5=False, whole=True):
+        self.chunk_size = chunk_size
+        self.total = hashlib.sha256() if whole else None
+        self.md5 = hashlib.md5() if md5 else None
+        self.chunks = []
+        self.size = 0
+        self._chunk = hashlib.sha256()
+        self._chunk_fill = 0
+
+    def update(self, data):
+        if self.total:
+            self.total.update(data)
+        if self.md5:
+            self.md5.update(data)
+        self.size += len(data)
+        view = memoryview(data)
+        while view:
+            take = min(self.chunk_size - self._chunk_fill, len(view))
+            self._chunk.update(view[:take])
+            self._chunk_fill += take
+            view = view[take:]
+            if self._chunk_fill == self.chunk_size:
+                self.chunks.append(self._chunk.hexdigest())
+                self._chunk = hashlib.sha256()
+                self._chunk_fill = 0
+
+    def manifest(self):
+        """Metadata fields describing the hashed bytes"""
+        chunks = list(self.chunks)
+        if self._chunk_fill or not chunks:
+            chunks.append(self._chunk.hexdigest())
+        manifest = {
+            'sha256': self.total.hexdigest() if self.total else None,
+            'size': self.size,
+            'chunk_size': self.chunk_size,
+            'chunks': chunks
+        }
+        if self.md5:
+            manifest['md5'] = base64.b64encode(self.md5.digest()).decode()
+        return manifest
+
+
+class HashingReader:
+    """Read-through wrapper that hashes everything read from `stream`"""
+
+    def __init__(self, stream, hasher):
+        self.stream = stream
+        self.hasher = hasher
+
+    def read(self, size=-1):
+        data = self.stream.read(size)
+        self.hasher.update(data)
+        return data
+
+
+class HashingWriter:
+    """Write-through wrapper that hashes everything written to `fileobj`"""
+
+    def __init__(self, fileobj, hasher):
+        self.fileobj = fileobj
+        self.hasher = hasher
+
+    def write(self, data):
+        self.hasher.update(data)
+        return self.fileobj.write(data)
+
+    def flush(self):
+        self.fileobj.flush()
+
+    def tell(self):
+        return self.hasher.size
+
+
+def copy_with_manifest(src, dst, md5=False):
+    """Copy `src` to `dst` in one pass; returns the manifest of the copied bytes"""
+    hasher = ChunkHasher(md5=md5)
+    while True:
+        chunk = src.read(COPY_CHUNK_SIZE)
+        if not chunk:
+            break
+        hasher.update(chunk)
+        dst.write(chunk)
+    return hasher.manifest()
+
+
+def manifest_for_bytes(data, md5=False):
+    hasher = ChunkHasher(md5=md5)
+    hasher.update(data)
+    return hasher.manifest()
+
+
+def read_full(src, view):
+    """readinto until `view` is full or EOF; returns the byte count"""
+    filled = 0
+    while filled < len(view):
+        n = src.readinto(view[filled:])
+        if not n:
+            break
+        filled += n
+    return filled
+
+
+def rehash_first_chunk(manifest, path):
+    """Refresh the first chunk's hash after the file's head was rewritten in place"""
+    with open(path, 'rb') as f:
+        manifest['chunks'][0] = hashlib.sha256(f.read(manifest['chunk_size'])).hexdigest()
+    return manifest
+
+
+def digest_header(sha256_hex):
+    """RFC 3230 Digest header value for a hex SHA-256"""
+    return 'sha-256=' + base64.b64encode(bytes.fromhex(sha256_hex)).decode()
+
+
+def verify_file(path, manifest, io_budget=None):
+    """Re-hash a stored file against its manifest
+
+    Returns the index of the first mismatching chunk, -1 if everything matches.
+    `io_budget` (bytes/sec) throttles reads so scrubbing never starves requests.
+    """
+    chunk_size = manifest['chunk_size']
+    expected = manifest['chunks']
+    total = hashlib.sha256()
+    index = 0
+    started = time.monotonic()
+    read_bytes = 0
+    # One buffer for the whole file instead of a new chunk_size bytes per chunk
+    view = memoryview(bytearray(chunk_size))
+    with open(path, 'rb', buffering=0) as f:
+        while True:
+            n = read_full(f, view)
+            if not n and index:
+                break
+            chunk = view[:n]
+            total.update(chunk)
+            if index >= len(expected) or hashlib.sha256(chunk).hexdigest() != expected[index]:
+                return index
+            index += 1
+            read_bytes += n
+            if io_budget:
+                # Sleep until we're back under the budget
+                ahead = read_bytes / io_budget - (time.monotonic() - started)
+                if ahead > 0:
+                    time.sleep(ahead)
+            if n < chunk_size:
+                break
+    # Chunk-only manifests (sha256 None) are fully covered by the chunk hashes
+    if index != len(expected) or manifest['sha256'] not in (None, total.hexdigest()):
+        return min(index, len(expected) - 1)
+    return -1
+
+
+def file_identity(path):
+    """(inode, mtime) pair used to detect a file being replaced mid-scrub"""
+    stat = os.stat(path)
+    return stat.st_ino, stat.st_mtime_ns
@@ -0,0 +1,81 @@
+#!/usr/bin/env python3
+"""
+File Listing for B-Transfer
+Builds the /files view from one directory scan plus each file's header record
+"""
+
+import os
+
+from .previews import preview_kind, available_kinds
+
+
+def preview_url(filename, metadata):
+    """Versioned /preview URL (cacheable forever), or None when there won't be one"""
+    if not metadata or metadata.get('is_locked') or metadata.get('storage_type') == 'cloud' \
+            or not metadata.get('sha256') or preview_kind(filename) not in available_kinds():
+        return None
+    return f"/preview/{filename}?v={metadata['sha256'][:16]}"
+
+
+def record_preview_url(filename, record):
+    """preview_url() from a header record"""
+    if record.is_locked or record.is_cloud or not any(record.sha256) \
+            or preview_kind(filename) not in available_kinds():
+        return None
+    return f"/preview/{filename}?v={record.sha256[:8].hex()}"
+
+
+def metadata_size(metadata):
+    """Original size when the local file isn't the content, else None (use the file's size)"""
+    if metadata and (metadata.get('storage_type') == 'cloud' or metadata.get('encoding')):
+        # Local entry is only the name reservation or compressed at rest
+        return int(metadata.get('size', 0))
+    return None
+
+
+def file_entry(filename, metadata, size, session_id):
+    """One /files row as seen by `session_id`"""
+    return {
+        'name': filename,
+        'size': size,
+        'is_locked': metadata.get('is_locked', False) if metadata else False,
+        'is_owner': metadata.get('session_id') == session_id if metadata else False,
+        'preview': preview_url(filename, metadata)
+    }
+
+
+def record_entry(filename, record, size, session_id):
+    """file_entry() from a header record, without building a metadata dict first"""
+    return {
+        'name': filename,
+        'size': size,
+        'is_locked': record.is_locked,
+        'is_owner': record.owned_by(session_id),
+        'preview': record_preview_url(filename, record)
+    }
+
+
+def list_files(core, session_id):
+    """List stored files with lock and ownership state for `session_id`
+
+    Reads each file's fixed-size header record rather than its .meta, and
+    builds one dict per row.
+    """
+    files = []
+    for entry in os.scandir(core.upload_folder):
+        filename = entry.name
+        if not entry.is_file() or filename.startswith('.') or filename.endswith('.meta'):
+            continue
+        record = core.file_header(filename)
+        if record is None:
+            files.append(file_entry(filename, None, entry.stat().st_size, session_id))
+            continue
+        if record.is_pending:
+            # Direct-to-cloud upload not finalized yet
+            continue
+        # Local entry is only the name reservation or compressed at rest
+        size = record.size if record.is_cloud or record.encoding else entry.stat().st_size
+        files.append(record_entry(filename, record, size, session_id))
+    
+    files.sort(key=lambda x: x['name'])
+    return files
@@ -0,0 +1,297 @@
+#!/usr/bin/env python3
+"""
+Previews for B-Transfer
+Thumbnails for images/videos/PDFs and text snippets, generated on a bounded
+worker pool with local tools and cached by content hash under a byte budget
+
+Images need Pillow, videos ffmpeg and PDFs pdftoppm; a type whose tool is
+missing just has no preview. Preview URLs carry the content hash, so they are
+served as immutable.
+"""
+
+import io
+import os
+import queue
+import shutil
+import threading
+import subprocess
+import importlib.util
+from collections import OrderedDict
+from contextlib import nullcontext
+from functools import lru_cache
+
+from .compression import decompress_chunks
+
+PREVIEW_KINDS = {
+    'png': 'image', 'jpg': 'image', 'jpeg': 'image', 'gif': 'image',
+    'mp4': 'video', 'avi': 'video', 'mov': 'video',
+    'pdf': 'pdf',
+    'txt': 'text', 'csv': 'text'
+}
+MIMETYPES = {'jpg': 'image/jpeg', 'txt': 'text/plain; charset=utf-8'}
+TEXT_PREVIEW_BYTES = 2048
+TOOL_TIMEOUT = 20  # seconds for ffmpeg/pdftoppm
+MAX_FAILURES = 1024  # remembered failed renders, least recently seen evicted first
+
+
+class PreviewUnavailable(Exception):
+    pass
+
+
+class StalePreview(PreviewUnavailable):
+    pass
+
+
+@lru_cache(maxsize=None)
+def available_kinds():
+    """Preview kinds this host can produce; missing codecs just mean no preview"""
+    kinds = {'text'}
+    if importlib.util.find_spec('PIL') is not None:
+        kinds.add('image')
+    if shutil.which('ffmpeg'):
+        kinds.add('video')
+    if shutil.which('pdftoppm'):
+        kinds.add('pdf')
+    return frozenset(kinds)
+
+
+def preview_kind(filename):
+    return PREVIEW_KINDS.get(filename.rsplit('.', 1)[-1].lower()) if '.' in filename else None
+
+
+def _image_thumbnail(data_or_path, size):
+    from PIL import Image  # optional; only imported when a preview is made
+    with Image.open(data_or_path) as img:
+        img.draft('RGB', (size, size))  # JPEG: decode at reduced scale
+        img.thumbnail((size, size))
+        out = io.BytesIO()
+        img.convert('RGB').save(out, 'JPEG', quality=80, optimize=True)
+        return out.getvalue()
+
+
+def _run_tool(args):
+    try:
+        result = subprocess.run(args, capture_output=True, timeout=TOOL_TIMEOUT, check=True)
+    except (subprocess.CalledProcessError, subprocess.TimeoutExpired) as e:
+        raise PreviewUnavailable(f"{args[0]} failed: {e}")
+    if not result.stdout:
+        raise PreviewUnavailable(f"{args[0]} produced no output")
+    return result.stdout
+
+
+def check_previewable(filename):
+    """Preview kind for `filename`, or PreviewUnavailable saying why there is none"""
+    kind = preview_kind(filename)
+    if kind is None:
+        raise PreviewUnavailable('No preview for this file type')
+    if kind not in available_kinds():
+        raise PreviewUnavailable(f'No {kind} codec available on this server')
+    return kind
+
+
+def generate_preview(path, filename, encoding, size):
+    """Render a preview of a stored file; returns (bytes, ext)"""
+    kind = check_previewable(filename)
+
+    if kind == 'text':
+        with open(path, 'rb') as f:
+            chunks = decompress_chunks(f, encoding) if encoding else iter(lambda: f.read(TEXT_PREVIEW_BYTES), b'')
+            head = b''
+            for chunk in chunks:
+                head += chunk
+                if len(head) >= TEXT_PREVIEW_BYTES:
+                    break
+        return head[:TEXT_PREVIEW_BYTES].decode('utf-8', errors='replace').encode(), 'txt'
+
+    if kind == 'image':
+        return _image_thumbnail(path, size), 'jpg'
+
+    if kind == 'video':
+        frame = _run_tool(['ffmpeg', '-v', 'error', '-ss', '1', '-i', path, '-frames:v', '1',
+                           '-vf', f'scale={size}:-2', '-f', 'image2', '-c:v', 'mjpeg', 'pipe:1'])
+        return frame, 'jpg'
+
+    page = _run_tool(['pdftoppm', '-jpeg', '-f', '1', '-l', '1', '-scale-to', str(size), '-singlefile', path])
+    return page, 'jpg'
+
+
+class PreviewCache:
+    """Content-hash keyed previews on disk, evicted least-recently-used over a byte budget"""
+
+    def __init__(self, root, budget):
+        self.root = root
+        self.budget = budget
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()  # key -> (filename, size), least recent first
+        self._used = 0
+        os.makedirs(root, exist_ok=True)
+
+        # Rebuild recency from access times so restarts keep the warm set
+        existing = []
+        for entry in os.scandir(root):
+            if entry.is_file() and not entry.name.endswith('.tmp'):
+                stat = entry.stat()
+                existing.append((stat.st_atime, entry.name, stat.st_size))
+        for _, name, size in sorted(existing):
+            self._entries[name.rsplit('.', 1)[0]] = (name, size)
+            self._used += size
+
+    def get(self, key):
+        """Path of a cached preview (and mark it recently used), or None"""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            self._entries.move_to_end(key)
+        return os.path.join(self.root, entry[0])
+
+    def put(self, key, data, ext):
+        name = f"{key}.{ext}"
+        path = os.path.join(self.root, name)
+        temp_path = f"{path}.{threading.get_ident()}.tmp"
+        with open(temp_path, 'wb') as f:
+            f.write(data)
+        os.replace(temp_path, path)
+
+        with self._lock:
+            old = self._entries.pop(key, None)
+            if old:
+                self._used -= old[1]
+            self._entries[key] = (name, len(data))
+            self._used += len(data)
+            evicted = []
+            while self._used > self.budget and len(self._entries) > 1:
+                _, (old_name, old_size) = self._entries.popitem(last=False)
+                self._used -= old_size
+                evicted.append(old_name)
+        for old_name in evicted:
+            try:
+                os.remove(os.path.join(self.root, old_name))
+            except FileNotFoundError:
+                pass
+        return path
+
+    def stats(self):
+        with self._lock:
+            return {'entries': len(self._entries), 'bytes': self._used, 'budget_bytes': self.budget}
+
+
+class PreviewPipeline:
+    """Generates previews after upload on `workers` threads fed by a bounded queue
+
+    With no workers (serverless) previews are rendered inline on first request.
+    A full queue drops the job; the preview is then made when first requested.
+    Renders hold the file's lock from `file_store` and first check its
+    `header` record, so a file locked or replaced after it was queued is
+    never rendered under the old content's key.
+    """
+
+    def __init__(self, cache, size, workers=2, queue_size=64, file_store=None, header=None):
+        self.cache = cache
+        self.size = size
+        self.workers = workers
+        self.file_store = file_store
+        self.header = header  # filename -> HeaderRecord or None
+        self._queue = queue.Queue(maxsize=queue_size)
+        self._inflight = set()
+        self._lock = threading.Lock()
+        self._started = False
+        self._failures = OrderedDict()  # key -> reason, so broken files aren't retried on every request
+
+    @staticmethod
+    def cache_key(metadata, size):
+        return f"{metadata['sha256']}-{size}"
+
+    def submit(self, path, filename, metadata):
+        """Queue preview generation; returns False if it wasn't queued"""
+        if not self.workers or not metadata.get('sha256') or preview_kind(filename) not in available_kinds():
+            return False
+        key = self.cache_key(metadata, self.size)
+        with self._lock:
+            if key in self._inflight or self.cache.get(key):
+                return False
+            self._start()
+            try:
+                self._queue.put_nowait((key, path, filename, metadata['sha256'], metadata.get('encoding')))
+            except queue.Full:
+                return False
+            self._inflight.add(key)
+        return True
+
+    def get_or_render(self, path, filename, metadata):
+        """Cached preview path; renders inline without workers, else returns None while pending"""
+        check_previewable(filename)
+        key = self.cache_key(metadata, self.size)
+        cached = self.cache.get(key)
+        if cached:
+            return cached
+        failure = self._failure(key)
+        if failure:
+            raise PreviewUnavailable(failure)
+        if not self.workers:
+            return self._render(key, path, filename, metadata['sha256'], metadata.get('encoding'))
+        if not self.submit(path, filename, metadata):
+            with self._lock:
+                if key not in self._inflight:
+                    raise PreviewUnavailable('Preview queue is full')
+        return None
+
+    def _render(self, key, path, filename, sha256, encoding):
+        with self.file_store.lock(filename) if self.file_store else nullcontext():
+            if self.header is not None:
+                # Locked, replaced or deleted since it was queued: nothing to cache or remember
+                record = self.header(filename)
+                if record is None or record.is_locked or record.is_cloud or record.sha256 != bytes.fromhex(sha256):
+                    raise StalePreview('File changed')
+            try:
+                data, ext = generate_preview(path, filename, encoding, self.size)
+            except FileNotFoundError:
+                raise
+            except Exception as e:
+                reason = str(e) if isinstance(e, PreviewUnavailable) else f'Preview failed: {e}'
+                self._remember_failure(key, reason)
+                raise PreviewUnavailable(reason)
+        return self.cache.put(key, data, ext)
+
+    def _failure(self, key):
+        with self._lock:
+            reason = self._failures.get(key)
+            if reason is not None:
+                self._failures.move_to_end(key)
+            return reason
+
+    def _remember_failure(self, key, reason):
+        with self._lock:
+            self._failures[key] = reason
+            self._failures.move_to_end(key)
+            while len(self._failures) > MAX_FAILURES:
+                self._failures.popitem(last=False)
+
+    def _start(self):
+        if self._started:
+            return
+        self._started = True
+        for _ in range(self.workers):
+            threading.Thread(target=self._work, daemon=True).start()
+
+    def _work(self):
+        while True:
+            key, path, filename, sha256, encoding = self._queue.get()
+            try:
+                self._render(key, path, filename, sha256, encoding)
+            except StalePreview:
+                pass  # rendered on request once it is previewable again
+            except PreviewUnavailable as e:
+                print(f"⚠️ No preview for {filename}: {e}")
+            except FileNotFoundError:
+                pass  # deleted before we got to it
+            finally:
+                with self._lock:
+                    self._inflight.discard(key)
+
+    def stats(self):
+        return {
+            'kinds': sorted(available_kinds()),
+            'queued': self._queue.qsize(),
+            **self.cache.stats()
+        }
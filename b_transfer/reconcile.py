@@ -0,0 +1,213 @@
+#!/usr/bin/env python3
+"""
+Cloud Reconciliation for B-Transfer
+Merges the paged bucket listing against the cloud-backed metadata, batch
+deleting orphaned objects and dropping metadata whose object is gone
+
+Only reports by default. Objects another deployment sharing the bucket
+uploaded have no metadata here and look orphaned, so deleting needs
+`--delete` (or RECONCILE_DELETE=1 for the background pass).
+
+Usage: python3 -m b_transfer.reconcile [--profile server] [--delete]
+"""
+
+import os
+import sys
+import json
+import time
+import argparse
+from datetime import datetime
+
+from . import config
+
+DELETE_BATCH_SIZE = 100  # GCS batch request limit
+LIST_PAGE_SIZE = 1000
+
+
+def cloud_index(core):
+    """Sorted (object name, filename) pairs for local metadata that points at a cloud object
+
+    Only these names are held in memory; the bucket side is streamed. The
+    24-hour lifetime keeps the local side small, while orphans in the bucket
+    can pile up without bound.
+    """
+    index = []
+    for entry in os.scandir(core.upload_folder):
+        if not entry.name.endswith('.meta') or entry.name.startswith('.'):
+            continue
+        filename = entry.name[:-len('.meta')]
+        header = core.file_header(filename)
+        if not header or not header.is_cloud:
+            continue
+        metadata = core.load_metadata(filename)
+        if metadata and metadata.get('storage_type') == 'cloud' and metadata.get('cloud_file_id'):
+            index.append((metadata['cloud_file_id'], filename))
+    index.sort()
+    return index
+
+
+def merge(objects, index):
+    """Yield (object, entry) in name order, with None on the side that's missing
+
+    `objects` must be in bucket order (lexicographic), which is also how
+    `index` is sorted.
+    """
+    entries = iter(index)
+    entry = next(entries, None)
+    for obj in objects:
+        while entry is not None and entry[0] < obj['name']:
+            yield None, entry
+            entry = next(entries, None)
+        matched = False
+        while entry is not None and entry[0] == obj['name']:
+            matched = True
+            yield obj, entry
+            entry = next(entries, None)
+        if not matched:
+            yield obj, None
+    while entry is not None:
+        yield None, entry
+        entry = next(entries, None)
+
+
+def _age(timestamp, now):
+    """Seconds since an RFC 3339 (GCS) or ISO (metadata) timestamp"""
+    try:
+        return now - datetime.fromisoformat(timestamp.replace('Z', '+00:00')).timestamp()
+    except (AttributeError, ValueError):
+        return 0  # unknown age: treat as new, never as stale
+
+
+class Reconciler:
+    """One reconciliation pass
+
+    Objects younger than `grace` are never called orphans (their metadata may
+    still be on its way) and pending direct uploads keep their metadata until
+    their signed URL has long expired.
+    """
+
+    def __init__(self, core, cloud_storage, dry_run=False, grace=3600, batch_size=DELETE_BATCH_SIZE):
+        self.core = core
+        self.cloud_storage = cloud_storage
+        self.dry_run = dry_run
+        self.grace = grace
+        self.batch_size = batch_size
+        self._batch = []
+        self.report = {
+            'dry_run': dry_run,
+            'objects_scanned': 0,
+            'bytes_scanned': 0,
+            'records_scanned': 0,
+            'orphans': 0,
+            'orphan_bytes': 0,
+            'orphans_deleted': 0,
+            'delete_failures': 0,
+            'dangling_records': 0,
+            'records_repaired': 0
+        }
+
+    def run(self):
+        started = time.time()
+        index = cloud_index(self.core)
+        objects = self.cloud_storage.iter_objects(LIST_PAGE_SIZE, fields='name,size,timeCreated')
+        for obj, entry in merge(objects, index):
+            if obj is not None:
+                self.report['objects_scanned'] += 1
+                self.report['bytes_scanned'] += int(obj.get('size', 0))
+            if entry is not None:
+                self.report['records_scanned'] += 1
+            if entry is None:
+                self._orphan(obj, started)
+            elif obj is None:
+                self._dangling(*entry, started)
+        self._flush()
+
+        elapsed = time.time() - started
+        self.report['elapsed_seconds'] = round(elapsed, 3)
+        self.report['objects_per_second'] = round(self.report['objects_scanned'] / max(elapsed, 1e-3), 1)
+        self.report['finished_at'] = datetime.now().isoformat()
+        return self.report
+
+    def _orphan(self, obj, now):
+        name = obj['name']
+        if _age(obj.get('timeCreated'), now) < self.grace:
+            return
+        # Metadata written since the index was taken
+        metadata = self.core.load_metadata(name)
+        if metadata and metadata.get('cloud_file_id') == name:
+            return
+        self.report['orphans'] += 1
+        self.report['orphan_bytes'] += int(obj.get('size', 0))
+        self._batch.append(name)
+        if len(self._batch) >= self.batch_size:
+            self._flush()
+
+    def _flush(self):
+        batch, self._batch = self._batch, []
+        if not batch or self.dry_run:
+            return
+        try:
+            failed = self.cloud_storage.delete_objects(batch)
+        except Exception as e:
+            print(f"⚠️ Orphan batch delete failed: {e}")
+            failed = batch
+        self.report['orphans_deleted'] += len(batch) - len(failed)
+        self.report['delete_failures'] += len(failed)
+
+    def _dangling(self, object_name, filename, now):
+        core = self.core
+        with core.file_store.lock(filename):
+            metadata = core.load_metadata(filename)
+            # Changed or gone since the index was taken
+            if not metadata or metadata.get('cloud_file_id') != object_name:
+                return
+            if metadata.get('status') == 'pending' and \
+                    _age(metadata.get('upload_time'), now) < config.SIGNED_URL_EXPIRATION + self.grace:
+                return
+            # The object may have been created after the listing passed its name
+            if self.cloud_storage.get_object(object_name) is not None:
+                return
+            self.report['dangling_records'] += 1
+            if self.dry_run:
+                return
+            core.remove_local(filename)
+        self.report['records_repaired'] += 1
+        core.publish('expire', filename)
+
+
+def reconcile(core, cloud_storage, dry_run=False, grace=None):
+    """Run one pass and log a summary; returns the report"""
+    reconciler = Reconciler(core, cloud_storage, dry_run=dry_run,
+                            grace=config.RECONCILE_GRACE if grace is None else grace)
+    report = reconciler.run()
+    verb = 'found' if dry_run else 'deleted'
+    print(f"🧹 Reconciled {report['objects_scanned']} cloud objects in {report['elapsed_seconds']}s "
+          f"({report['objects_per_second']}/s): {report['orphans']} orphans {verb} "
+          f"({report['orphan_bytes']} bytes), {report['dangling_records']} dangling records"
+          f"{' (dry run)' if dry_run else ' repaired'}")
+    return report
+
+
+def main():
+    parser = argparse.ArgumentParser(description='B-Transfer cloud reconciliation')
+    parser.add_argument('--profile', default='server', choices=sorted(config.PROFILES))
+    parser.add_argument('--delete', action='store_true',
+                        help='delete orphans and drop dangling records instead of only reporting them')
+    parser.add_argument('--grace', type=int, default=config.RECONCILE_GRACE,
+                        help='seconds before a new object can count as an orphan')
+    args = parser.parse_args()
+
+    from .cloud_storage import get_cloud_storage
+    from .core import TransferCore
+
+    cloud_storage = get_cloud_storage()
+    if not cloud_storage or not cloud_storage.service:
+        print("❌ Cloud storage is not configured")
+        return 1
+    report = reconcile(TransferCore(args.profile), cloud_storage, dry_run=not args.delete, grace=args.grace)
+    print(json.dumps(report, indent=2))
+    return 1 if report['delete_failures'] else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,290 @@
+#!/usr/bin/env python3
+"""
+LAN Relay for B-Transfer
+Pipes bytes from a sender straight to a receiver through bounded in-memory
+buffers, spooling to disk (store-and-forward) when the receiver isn't online
+"""
+
+import os
+import time
+import secrets
+import threading
+from collections import deque
+
+CHUNK_SIZE = 64 * 1024
+
+
+class RelayError(Exception):
+    pass
+
+
+class RelayBusy(RelayError):
+    pass
+
+
+class RelayBuffer:
+    """Bounded byte pipe: writers block while `capacity` bytes are unread (backpressure)"""
+
+    def __init__(self, capacity):
+        self.capacity = capacity
+        self._chunks = deque()
+        self._buffered = 0
+        self._closed = False
+        self._error = None
+        self._cond = threading.Condition()
+
+    def write(self, data, timeout):
+        with self._cond:
+            if not self._cond.wait_for(lambda: self._buffered < self.capacity or self._error, timeout):
+                raise RelayError('Receiver stalled')
+            if self._error:
+                raise RelayError(self._error)
+            self._chunks.append(data)
+            self._buffered += len(data)
+            self._cond.notify_all()
+
+    def read(self, timeout):
+        """Next chunk, or b'' once the writer has closed and everything is read"""
+        with self._cond:
+            if not self._cond.wait_for(lambda: self._chunks or self._closed or self._error, timeout):
+                raise RelayError('Sender stalled')
+            if self._error:
+                raise RelayError(self._error)
+            if not self._chunks:
+                return b''
+            chunk = self._chunks.popleft()
+            self._buffered -= len(chunk)
+            self._cond.notify_all()
+            return chunk
+
+    def close(self):
+        with self._cond:
+            self._closed = True
+            self._cond.notify_all()
+
+    def abort(self, reason):
+        with self._cond:
+            self._error = reason
+            self._cond.notify_all()
+
+
+class RelayStream:
+    """One of a transfer's parallel streams: piped live, or spooled until the receiver shows up"""
+
+    def __init__(self, index, buffer_size, spool_path):
+        self.index = index
+        self.buffer = RelayBuffer(buffer_size)
+        self.spool_path = spool_path
+        self.mode = None  # 'pipe' or 'spool', fixed when the sender arrives
+        self.bytes = 0
+        self.reservation = None  # capacity reservation held by a spooled stream
+        self.delivered = False
+        self.error = None
+        self._lock = threading.Lock()
+        self._sender = False
+        self._receiver = False
+        self._receiver_attached = threading.Event()
+        self._decided = threading.Event()
+        self._done = threading.Event()
+
+    def start_send(self):
+        with self._lock:
+            if self._sender:
+                raise RelayError('Stream already has a sender')
+            self._sender = True
+
+    def attach_receiver(self):
+        with self._lock:
+            if self._receiver:
+                raise RelayError('Stream already has a receiver')
+            self._receiver = True
+            self._receiver_attached.set()
+
+    def detach_receiver(self):
+        """Let a receiver that dropped off reconnect; a spooled stream is served again from the start"""
+        with self._lock:
+            self._receiver = False
+            self._receiver_attached.clear()
+
+    def choose_mode(self, wait):
+        """Pipe if a receiver connects within `wait` seconds, otherwise spool"""
+        self._receiver_attached.wait(wait)
+        with self._lock:
+            self.mode = 'pipe' if self._receiver else 'spool'
+        self._decided.set()
+        return self.mode
+
+    def fail(self, reason):
+        """Give up on a stream before any bytes were sent"""
+        self.error = reason
+        self.buffer.abort(reason)
+        self._done.set()
+
+    def pipe(self, src, idle_timeout):
+        try:
+            while True:
+                chunk = src.read(CHUNK_SIZE)
+                if not chunk:
+                    break
+                self.buffer.write(chunk, idle_timeout)
+                self.bytes += len(chunk)
+        except Exception as e:
+            self.buffer.abort(f'Sender failed: {e}')
+            raise
+        self.buffer.close()
+        self._done.set()
+
+    def spool(self, src):
+        try:
+            with open(self.spool_path, 'wb') as dst:
+                while True:
+                    chunk = src.read(CHUNK_SIZE)
+                    if not chunk:
+                        break
+                    dst.write(chunk)
+                    self.bytes += len(chunk)
+        except Exception as e:
+            self.error = f'Sender failed: {e}'
+            raise
+        finally:
+            self._done.set()
+
+    def receive(self, idle_timeout):
+        """Generator of the stream's bytes for the receiver's response
+
+        Every wait is bounded by `idle_timeout` without progress, so a
+        receiver never holds its thread for a stalled sender.
+        """
+        if not self._decided.wait(idle_timeout):
+            raise RelayError('Sender never connected')
+
+        if self.mode == 'pipe':
+            while True:
+                chunk = self.buffer.read(idle_timeout)
+                if not chunk:
+                    return
+                yield chunk
+
+        # Store-and-forward: wait for the spooled copy to be complete, then serve it
+        spooled = -1
+        while not self._done.wait(idle_timeout):
+            if self.bytes == spooled:
+                raise RelayError('Sender stalled')
+            spooled = self.bytes
+        if self.error:
+            raise RelayError(self.error)
+        with open(self.spool_path, 'rb') as f:
+            while True:
+                chunk = f.read(CHUNK_SIZE)
+                if not chunk:
+                    break
+                yield chunk
+
+    def abort(self, reason):
+        self.buffer.abort(reason)
+
+
+class RelayTransfer:
+    def __init__(self, transfer_id, filename, size, session_id, streams):
+        self.id = transfer_id
+        self.filename = filename
+        self.size = size
+        self.session_id = session_id
+        self.streams = streams
+        self.created = time.time()
+
+    def stream(self, index):
+        if not 0 <= index < len(self.streams):
+            raise RelayError('No such stream')
+        return self.streams[index]
+
+
+class RelayHub:
+    """Registry of live transfers; total memory is bounded by max_transfers x streams x buffer_size"""
+
+    def __init__(self, spool_dir, buffer_size, max_streams, max_transfers, ttl, on_release=None):
+        self.spool_dir = spool_dir
+        self.buffer_size = buffer_size
+        self.max_streams = max_streams
+        self.max_transfers = max_transfers
+        self.ttl = ttl
+        self.on_release = on_release  # callback(reservation) when a spooled stream is dropped
+        self._transfers = {}
+        self._lock = threading.Lock()
+        self._relayed_bytes = 0
+        self._spooled_bytes = 0
+        os.makedirs(spool_dir, exist_ok=True)
+
+    def register(self, filename, size, session_id, streams=1):
+        if not 1 <= streams <= self.max_streams:
+            raise RelayError(f'Streams must be between 1 and {self.max_streams}')
+        self.expire()
+        with self._lock:
+            if len(self._transfers) >= self.max_transfers:
+                raise RelayBusy('Too many active relay transfers')
+            transfer_id = secrets.token_urlsafe(16)
+            transfer = RelayTransfer(transfer_id, filename, size, session_id, [
+                RelayStream(i, self.buffer_size, os.path.join(self.spool_dir, f'{transfer_id}.{i}'))
+                for i in range(streams)
+            ])
+            self._transfers[transfer_id] = transfer
+        return transfer
+
+    def get(self, transfer_id):
+        with self._lock:
+            transfer = self._transfers.get(transfer_id)
+        if transfer is None or time.time() - transfer.created > self.ttl:
+            raise RelayError('Transfer not found')
+        return transfer
+
+    def record(self, stream):
+        with self._lock:
+            if stream.mode == 'pipe':
+                self._relayed_bytes += stream.bytes
+            else:
+                self._spooled_bytes += stream.bytes
+
+    def finish_receive(self, transfer, stream):
+        """Drop a delivered stream's spool; forget the transfer once every stream is delivered"""
+        self._discard_spool(stream)
+        stream.delivered = True
+        if all(s.delivered for s in transfer.streams):
+            with self._lock:
+                self._transfers.pop(transfer.id, None)
+
+    def expire(self):
+        """Abort and clean up transfers older than the TTL"""
+        now = time.time()
+        with self._lock:
+            stale = [t for t in self._transfers.values() if now - t.created > self.ttl]
+            for transfer in stale:
+                del self._transfers[transfer.id]
+        for transfer in stale:
+            for stream in transfer.streams:
+                stream.abort('Transfer expired')
+                self._discard_spool(stream)
+        
+        # Spools left behind by a restarted process
+        for entry in os.scandir(self.spool_dir):
+            try:
+                if now - entry.stat().st_mtime > self.ttl:
+                    os.remove(entry.path)
+            except FileNotFoundError:
+                pass
+
+    def _discard_spool(self, stream):
+        try:
+            os.remove(stream.spool_path)
+        except FileNotFoundError:
+            pass
+        if stream.reservation is not None and self.on_release:
+            self.on_release(stream.reservation)
+            stream.reservation = None
+
+    def stats(self):
+        with self._lock:
+            return {
+                'active_transfers': len(self._transfers),
+                'relayed_bytes': self._relayed_bytes,
+                'spooled_bytes': self._spooled_bytes
+            }
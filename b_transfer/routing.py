@@ -0,0 +1,172 @@
+#!/usr/bin/env python3
+"""
+Upload Routing for B-Transfer
+Decides local vs cloud storage from the bytes actually received: up front for
+uploads the form parser has already spooled, otherwise by switching to a cloud
+resumable session mid-stream once the threshold is crossed
+"""
+
+import time
+import base64
+import hashlib
+import threading
+
+SPILL_READ_SIZE = 1024 * 1024
+SLOW_CLOUD_BPS = 4 * 1024 * 1024  # below this, cloud offload costs users more than it saves
+THROUGHPUT_SMOOTHING = 0.3  # EWMA weight of the newest cloud transfer
+
+
+class UploadRouter:
+    """Runtime local->cloud threshold from disk pressure and observed cloud throughput
+
+    The configured threshold applies while the disk is under half full. Above
+    that it shrinks linearly to `min_threshold` at the eviction high-water
+    mark, so pressure pushes uploads to the cloud sooner. With a roomy disk
+    and a slow cloud it doubles instead, keeping more uploads local.
+    """
+
+    def __init__(self, capacity, base_threshold, min_threshold=16 * 1024 * 1024, max_threshold=None):
+        self.capacity = capacity
+        self.base_threshold = base_threshold
+        self.min_threshold = min(min_threshold, base_threshold)
+        self.max_threshold = max_threshold or base_threshold * 4
+        self._lock = threading.Lock()
+        self._cloud_bps = None
+        self._cloud_failures = 0
+
+    def threshold(self):
+        utilization = self.capacity.usage()['utilization']
+        high_water = self.capacity.high_water
+        threshold = self.base_threshold
+        if utilization > 0.5:
+            threshold *= max(0.0, (high_water - utilization) / (high_water - 0.5))
+        elif self._cloud_bps is not None and self._cloud_bps < SLOW_CLOUD_BPS:
+            threshold *= 2
+        return int(min(max(threshold, self.min_threshold), self.max_threshold))
+
+    def record_cloud(self, nbytes, seconds):
+        bps = nbytes / max(seconds, 1e-3)
+        with self._lock:
+            if self._cloud_bps is None:
+                self._cloud_bps = bps
+            else:
+                self._cloud_bps += THROUGHPUT_SMOOTHING * (bps - self._cloud_bps)
+
+    def record_cloud_failure(self):
+        # A failed transfer counts as a very slow one
+        with self._lock:
+            self._cloud_failures += 1
+            self._cloud_bps = (self._cloud_bps or SLOW_CLOUD_BPS) / 2
+
+    def stats(self):
+        with self._lock:
+            cloud_bps = self._cloud_bps
+            failures = self._cloud_failures
+        return {
+            'threshold_bytes': self.threshold(),
+            'base_threshold_bytes': self.base_threshold,
+            'cloud_throughput_bps': int(cloud_bps) if cloud_bps is not None else None,
+            'cloud_failures': failures
+        }
+
+
+def spooled_size(stream):
+    """Bytes left in an upload the form parser already spooled, or None if `stream` can't seek"""
+    try:
+        position = stream.tell()
+        stream.seek(0, 2)
+        size = stream.tell()
+        stream.seek(position)
+    except (AttributeError, OSError, ValueError):
+        return None
+    return size - position
+
+
+class SpillWriter:
+    """File-like sink that writes to `path` until `threshold` bytes, then moves to the cloud
+
+    With a known `size` the route is picked before anything is written.
+    Otherwise, on crossing the threshold the bytes written so far are
+    replayed into a resumable upload from disk, `path` is truncated back to
+    an empty name reservation and the rest of the stream goes straight to
+    the cloud.
+    """
+
+    def __init__(self, path, name, threshold, open_cloud, size=None):
+        self.path = path
+        self.name = name
+        self.threshold = threshold
+        self.open_cloud = open_cloud  # callable(name) -> ResumableUpload or None
+        self.size = 0
+        self.upload = None
+        self.md5 = None
+        self.started = None
+        self._file = open(path, 'wb')
+        if size is not None and threshold is not None:
+            if size > threshold:
+                self._spill()  # nothing written yet, so nothing to replay
+            self.threshold = None
+
+    def write(self, data):
+        if self.upload is None and self.threshold is not None and self.size + len(data) > self.threshold:
+            self._spill()
+        if self.upload is not None:
+            self.upload.write(data)
+            self.md5.update(data)
+        else:
+            self._file.write(data)
+        self.size += len(data)
+        return len(data)
+
+    def flush(self):
+        if self.upload is None:
+            self._file.flush()
+
+    def tell(self):
+        return self.size
+
+    def _spill(self):
+        self.threshold = None  # one attempt; stay local if the cloud isn't there
+        upload = self.open_cloud(self.name)
+        if upload is None:
+            return
+        self.started = time.time()
+        self.md5 = hashlib.md5()
+        self._file.close()
+        try:
+            with open(self.path, 'rb') as f:
+                while True:
+                    chunk = f.read(SPILL_READ_SIZE)
+                    if not chunk:
+                        break
+                    upload.write(chunk)
+                    self.md5.update(chunk)
+        except Exception:
+            upload.abort()
+            raise
+        # Keep the (now empty) file as the name reservation
+        self._file = open(self.path, 'wb')
+        self.upload = upload
+
+    @property
+    def in_cloud(self):
+        return self.upload is not None
+
+    def md5_base64(self):
+        return base64.b64encode(self.md5.digest()).decode()
+
+    def close(self):
+        """Finish the upload; returns the cloud object resource or None if the file stayed local"""
+        self._file.close()
+        if self.upload is None:
+            return None
+        try:
+            return self.upload.finish()
+        except Exception:
+            self.upload.abort()
+            raise
+
+    def abort(self):
+        self._file.close()
+        if self.upload is not None:
+            self.upload.abort()
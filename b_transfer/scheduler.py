@@ -0,0 +1,335 @@
+#!/usr/bin/env python3
+"""
+Transfer Scheduler for B-Transfer
+Keeps small/interactive requests fast under bulk load: bulk transfers get a
+capped number of slots, and their bytes are granted per session by deficit
+weighted round-robin, so one user's parallel transfers share one fair share
+"""
+
+import os
+import time
+import threading
+
+try:
+    import fcntl
+except ImportError:  # Windows - slots are per process
+    fcntl = None
+
+SLOT_POLL_INTERVAL = 0.2  # seconds between retries for a slot another process may free
+SHARE_REFRESH_INTERVAL = 1  # seconds a count of every process's bulk transfers is reused
+
+
+class SchedulerBusy(Exception):
+    pass
+
+
+class _Share:
+    """A session's bulk streams and its credit in the current round"""
+
+    __slots__ = ('weight', 'streams', 'waiting', 'deficit', 'last_request', 'sent')
+
+    def __init__(self, weight):
+        self.weight = weight
+        self.streams = 0
+        self.waiting = 0  # streams blocked in _take, i.e. backlogged
+        self.deficit = 0
+        self.last_request = 0
+        self.sent = 0
+
+
+class _SlotFiles:
+    """Bulk slots shared by every process using `directory`; slot i is held while slot-i is flocked
+
+    Holders write their session id into the slot file so the per-session cap
+    holds across processes too. Slots of a process that dies are freed with
+    its flocks.
+    """
+
+    def __init__(self, directory, count):
+        self.directory = directory
+        self.count = count
+        os.makedirs(directory, exist_ok=True)
+
+    def _open(self, name):
+        return os.open(os.path.join(self.directory, name), os.O_RDWR | os.O_CREAT, 0o600)
+
+    def _try_lock(self, fd):
+        try:
+            fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            return True
+        except BlockingIOError:
+            return False
+
+    def claim(self, session_id, max_per_session):
+        """Flocked fd of a free slot, or None if all are held or the session already has its share"""
+        owner = session_id.encode()[:64]
+        admit = self._open('admit.lock')
+        try:
+            fcntl.flock(admit, fcntl.LOCK_EX)
+            free = None
+            session_slots = 0
+            for i in range(self.count):
+                fd = self._open(f"slot-{i}")
+                if not self._try_lock(fd):
+                    session_slots += os.pread(fd, 64, 0) == owner
+                    os.close(fd)
+                elif free is None:
+                    free = fd
+                else:
+                    os.close(fd)
+            if free is not None and session_slots >= max_per_session:
+                os.close(free)
+                free = None
+            if free is not None:
+                os.ftruncate(free, 0)
+                os.pwrite(free, owner, 0)
+            return free
+        finally:
+            os.close(admit)
+
+    def release(self, fd):
+        os.close(fd)  # drops the flock
+
+    def held(self):
+        """Slots held by all processes together"""
+        held = 0
+        for i in range(self.count):
+            fd = self._open(f"slot-{i}")
+            held += not self._try_lock(fd)
+            os.close(fd)
+        return held
+
+
+class TransferScheduler:
+    """Admission and fair pacing for bulk transfers
+
+    Transfers under `bulk_threshold` bytes are never scheduled. Bulk ones
+    wait up to `queue_timeout` for one of `max_bulk` slots (at most
+    `max_per_session` per session), so interactive requests always find a
+    free worker thread. While streaming, each chunk spends its session's
+    credit. Every round tops each session up by `quantum * weight` bytes, and
+    a new round starts once every backlogged session (one with a stream
+    waiting for credit) is out of credit. Sessions busy elsewhere, such as
+    writing to a slow client, never hold a round up, and their credit is
+    capped at one round so it can't be banked. With a `rate` (bytes/sec for
+    all bulk transfers together) rounds are spaced out to match it, which
+    keeps backlogged sessions waiting here and so splits the rate between
+    them evenly; without one, pacing only orders transfers that outrun the
+    link between themselves.
+
+    With a `slot_dir` shared by several worker processes, the slot caps
+    (`max_bulk`, `max_per_session`) hold across all of them, and each process
+    paces to the part of `rate` matching its share of the held slots. Byte
+    fairness between sessions holds within a process; across processes it is
+    per transfer.
+    """
+
+    def __init__(self, max_bulk=4, max_per_session=2, bulk_threshold=8 * 1024 * 1024,
+                 quantum=256 * 1024, queue_timeout=10, round_timeout=0.05, rate=None, slot_dir=None):
+        self.max_bulk = max_bulk
+        self.max_per_session = max_per_session
+        self.bulk_threshold = bulk_threshold
+        self.quantum = quantum
+        self.queue_timeout = queue_timeout
+        self.round_timeout = round_timeout
+        self.rate = rate
+
+        self._cond = threading.Condition()
+        self._shares = {}  # session id -> _Share
+        self._active = 0
+        self._queued = 0
+        self._rounds = 0
+        self._rejected = 0
+        self._bytes = 0
+        self._next_round = 0  # monotonic time the rate allows the next round
+        self._slots = _SlotFiles(slot_dir, max_bulk) if slot_dir and fcntl is not None else None
+        self._held = (0, 0)  # (monotonic time, slots held by every process)
+
+    def is_bulk(self, size):
+        """Unknown sizes (chunked uploads) count as bulk"""
+        return size is None or size >= self.bulk_threshold
+
+    # Admission
+
+    def admit(self, session_id, weight=1):
+        """Claim a bulk slot, waiting up to queue_timeout; returns a Ticket or raises SchedulerBusy"""
+        deadline = time.monotonic() + self.queue_timeout
+        with self._cond:
+            self._queued += 1
+            slot = None
+            try:
+                while True:
+                    if self._has_slot(session_id):
+                        if self._slots is None:
+                            break
+                        slot = self._slots.claim(session_id, self.max_per_session)
+                        if slot is not None:
+                            break
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        self._rejected += 1
+                        raise SchedulerBusy('Too many large transfers in progress')
+                    # Other processes' releases don't notify us
+                    self._cond.wait(remaining if self._slots is None else min(remaining, SLOT_POLL_INTERVAL))
+            finally:
+                self._queued -= 1
+            share = self._shares.get(session_id)
+            if share is None:
+                share = self._shares[session_id] = _Share(weight)
+            share.streams += 1
+            self._active += 1
+        return Ticket(self, session_id, slot)
+
+    def _has_slot(self, session_id):
+        share = self._shares.get(session_id)
+        return self._active < self.max_bulk and (share is None or share.streams < self.max_per_session)
+
+    def _release(self, session_id, slot):
+        with self._cond:
+            if slot is not None:
+                self._slots.release(slot)
+            share = self._shares[session_id]
+            share.streams -= 1
+            self._active -= 1
+            if share.streams == 0:
+                del self._shares[session_id]
+            self._cond.notify_all()
+
+    # Pacing
+
+    def _take(self, session_id, nbytes):
+        """Block until `session_id` has credit for `nbytes`, then spend it"""
+        with self._cond:
+            share = self._shares[session_id]
+            share.last_request = nbytes
+            share.waiting += 1
+            try:
+                while share.deficit < nbytes:
+                    delay = self.round_timeout
+                    if self._round_due():
+                        delay = self._next_round - time.monotonic()
+                        if delay <= 0:
+                            self._new_round()
+                            continue
+                    self._cond.wait(delay)
+            finally:
+                share.waiting -= 1
+            share.deficit -= nbytes
+            share.sent += nbytes
+            self._bytes += nbytes
+
+    def _round_due(self):
+        """No backlogged session can send; idle ones don't count"""
+        return all(share.deficit < share.last_request for share in self._shares.values() if share.waiting)
+
+    def _new_round(self):
+        self._rounds += 1
+        granted = 0
+        for share in self._shares.values():
+            # No banking beyond one round, except what a single oversized chunk needs
+            grant = self.quantum * share.weight
+            share.deficit = min(share.deficit + grant, max(grant, share.last_request))
+            if share.waiting:
+                granted += grant
+        if self.rate:
+            self._next_round = time.monotonic() + granted / self._local_rate()
+        self._cond.notify_all()
+
+    def _local_rate(self):
+        """This process's part of `rate`, by its share of the bulk slots held everywhere"""
+        if self._slots is None:
+            return self.rate
+        now = time.monotonic()
+        checked, held = self._held
+        if now - checked > SHARE_REFRESH_INTERVAL:
+            held = self._slots.held()
+            self._held = (now, held)
+        return self.rate * self._active / max(held, self._active, 1)
+
+    def stats(self):
+        with self._cond:
+            return {
+                'active_bulk': self._active,
+                'shared_slots': self._slots is not None,
+                'queued_bulk': self._queued,
+                'sessions': len(self._shares),
+                'max_bulk': self.max_bulk,
+                'bulk_threshold_bytes': self.bulk_threshold,
+                'rate_bytes_per_second': self.rate,
+                'rounds': self._rounds,
+                'rejected': self._rejected,
+                'bytes_scheduled': self._bytes
+            }
+
+
+class Ticket:
+    """A bulk transfer's slot; pace its bytes with paced()/reader(), then release()"""
+
+    def __init__(self, scheduler, session_id, slot=None):
+        self.scheduler = scheduler
+        self.session_id = session_id
+        self.slot = slot  # flocked slot file shared with other processes, if any
+        self._released = False
+
+    def paced(self, chunks):
+        return _PacedBody(chunks, self)
+
+    def reader(self, stream):
+        return _PacedReader(stream, self)
+
+    def release(self):
+        if not self._released:
+            self._released = True
+            self.scheduler._release(self.session_id, self.slot)
+
+
+class _PacedBody:
+    """Response iterable that waits for its turn before each chunk; closing it releases the ticket
+
+    The WSGI server closes the iterable itself even for direct-passthrough
+    (send_file) responses, whose call_on_close callbacks never run.
+    """
+
+    def __init__(self, chunks, ticket):
+        self.chunks = chunks
+        self.ticket = ticket
+
+    def __iter__(self):
+        for chunk in self.chunks:
+            self.ticket.scheduler._take(self.ticket.session_id, len(chunk))
+            yield chunk
+
+    def close(self):
+        try:
+            if hasattr(self.chunks, 'close'):
+                self.chunks.close()
+        finally:
+            self.ticket.release()
+
+
+class _PacedReader:
+    """Request body stream that charges each read to the ticket's session"""
+
+    def __init__(self, stream, ticket):
+        self.stream = stream
+        self.ticket = ticket
+
+    def _charge(self, data):
+        if data and not self.ticket._released:
+            self.ticket.scheduler._take(self.ticket.session_id, len(data))
+        return data
+
+    def read(self, *args):
+        return self._charge(self.stream.read(*args))
+
+    def readline(self, *args):
+        return self._charge(self.stream.readline(*args))
+
+    def readinto(self, b):
+        n = self.stream.readinto(b)
+        if n and not self.ticket._released:
+            self.ticket.scheduler._take(self.ticket.session_id, n)
+        return n
+
+    def __getattr__(self, name):
+        return getattr(self.stream, name)
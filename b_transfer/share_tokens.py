@@ -0,0 +1,153 @@
+#!/usr/bin/env python3
+"""
+Share Tokens for B-Transfer
+HMAC-signed, expiring share links verified without touching disk, with
+download-count limits kept in memory and persisted periodically
+"""
+
+import hmac
+import time
+import base64
+import hashlib
+import secrets
+import threading
+
+TOKEN_VERSION = 'v1'
+COUNTS_FILE = '.share_counts.json'
+PERMISSIONS = {'r': 'download', 'd': 'delete'}
+
+
+class ShareTokenError(Exception):
+    pass
+
+
+def _b64encode(data):
+    return base64.urlsafe_b64encode(data).rstrip(b'=').decode()
+
+
+def _b64decode(text):
+    return base64.urlsafe_b64decode(text + '=' * (-len(text) % 4))
+
+
+class ShareTokens:
+    def __init__(self, secret_key, file_store, node_id, flush_interval=30):
+        # Separate key so share links can't be replayed as session cookies or vice versa
+        self._key = hmac.new(secret_key.encode(), b'b-transfer share tokens', hashlib.sha256).digest()
+        self.file_store = file_store
+        self.node_id = node_id
+        self.flush_interval = flush_interval  # 0 persists on every download
+
+        self._lock = threading.Lock()
+        self._local = {}  # token id -> [downloads by this process, expires]
+        self._others = {}  # token id -> downloads by other processes at last flush
+        self._loaded = False
+        self._dirty = False
+
+    # Issue / verify
+
+    def issue(self, filename, file_version, expires_at, permissions='r', max_downloads=None):
+        """Signed token for `filename`; `file_version` binds it to this upload of the name"""
+        if not permissions or any(p not in PERMISSIONS for p in permissions):
+            raise ShareTokenError('Invalid permissions')
+        token_id = secrets.token_hex(6)
+        payload = '|'.join([token_id, filename, file_version, str(int(expires_at)),
+                            permissions, str(max_downloads or 0)]).encode()
+        return f"{TOKEN_VERSION}.{_b64encode(payload)}.{_b64encode(self._sign(payload))}"
+
+    def verify(self, token, permission):
+        """Check signature, expiry and permission in O(1); returns the claims"""
+        try:
+            version, payload_b64, signature_b64 = token.split('.')
+            payload = _b64decode(payload_b64)
+            signature = _b64decode(signature_b64)
+        except ValueError:
+            raise ShareTokenError('Malformed share token')
+        if version != TOKEN_VERSION or not hmac.compare_digest(signature, self._sign(payload)):
+            raise ShareTokenError('Invalid share token')
+
+        token_id, filename, file_version, expires_at, permissions, max_downloads = payload.decode().split('|')
+        if time.time() > int(expires_at):
+            raise ShareTokenError('Share link expired')
+        if permission not in permissions:
+            raise ShareTokenError('Share link does not allow this action')
+        return {
+            'id': token_id,
+            'filename': filename,
+            'file_version': file_version,
+            'expires_at': int(expires_at),
+            'permissions': permissions,
+            'max_downloads': int(max_downloads) or None
+        }
+
+    def _sign(self, payload):
+        return hmac.new(self._key, payload, hashlib.sha256).digest()[:16]
+
+    # Download limits
+
+    def consume(self, claims):
+        """Count one download; False once the link's limit is used up"""
+        with self._lock:
+            self._load()
+            entry = self._local.setdefault(claims['id'], [0, claims['expires_at']])
+            used = entry[0] + self._others.get(claims['id'], 0)
+            if claims['max_downloads'] and used >= claims['max_downloads']:
+                return False
+            entry[0] += 1
+            self._dirty = True
+        if not self.flush_interval:
+            self.flush()
+        return True
+
+    def refund(self, claims):
+        """Give back a download counted by consume() that didn't deliver the file"""
+        with self._lock:
+            entry = self._local.get(claims['id'])
+            if not entry or entry[0] <= 0:
+                return
+            entry[0] -= 1
+            self._dirty = True
+        if not self.flush_interval:
+            self.flush()
+
+    def _load(self):
+        if self._loaded:
+            return
+        counts = self.file_store.read_json(COUNTS_FILE) or {}
+        self._local = {tid: list(entry) for tid, entry in counts.get(self.node_id, {}).items()}
+        self._others = self._sum_nodes(counts, exclude=self.node_id)
+        self._loaded = True
+
+    def flush(self):
+        """Merge this process's counts into the shared file and pick up everyone else's"""
+        with self._lock:
+            if not self._loaded:
+                return
+            now = time.time()
+            dirty = self._dirty
+            local = {tid: list(entry) for tid, entry in self._local.items() if entry[1] > now}
+            self._dirty = False
+
+        with self.file_store.lock(COUNTS_FILE):
+            counts = self.file_store.read_json(COUNTS_FILE) or {}
+            if dirty:
+                counts[self.node_id] = local
+                # Drop expired links so the file doesn't grow without bound
+                for node, entries in list(counts.items()):
+                    counts[node] = {tid: entry for tid, entry in entries.items() if entry[1] > now}
+                    if not counts[node]:
+                        del counts[node]
+                self.file_store.write_json(COUNTS_FILE, counts)
+
+        with self._lock:
+            self._others = self._sum_nodes(counts, exclude=self.node_id)
+            self._local = {tid: entry for tid, entry in self._local.items() if entry[1] > now}
+
+    @staticmethod
+    def _sum_nodes(counts, exclude):
+        totals = {}
+        for node, entries in counts.items():
+            if node == exclude:
+                continue
+            for tid, (downloads, _) in entries.items():
+                totals[tid] = totals.get(tid, 0) + downloads
+        return totals
@@ -0,0 +1,63 @@
+#!/usr/bin/env python3
+"""
+Shared State for B-Transfer
+Settings that must agree across gunicorn workers and nodes behind a load balancer
+"""
+
+import os
+import time
+import socket
+import secrets
+
+SECRET_KEY_FILE = '.secret_key'
+
+
+def get_data_dir(default):
+    """Storage root for files and metadata; point every node at the same mount"""
+    return os.environ.get('B_TRANSFER_DATA_DIR', default)
+
+
+def is_multi_node():
+    return os.environ.get('B_TRANSFER_MULTI_NODE') == '1'
+
+
+def get_node_id():
+    return f"{socket.gethostname()}:{os.getpid()}"
+
+
+def get_secret_key(data_dir):
+    """Session signing key shared by every worker and node
+
+    SECRET_KEY from the environment wins. Otherwise the first process to start
+    writes a random key into the data directory and everyone else reads it, so
+    workers sharing a data directory always sign sessions with the same key.
+    """
+    key = os.environ.get('SECRET_KEY')
+    if key:
+        return key
+
+    os.makedirs(data_dir, exist_ok=True)
+    path = os.path.join(data_dir, SECRET_KEY_FILE)
+    if not os.path.exists(path):
+        # Write to a private temp file, then link it into place: the key file
+        # appears atomically with its content, and only one creator wins
+        temp_path = f"{path}.{get_node_id().replace(':', '.')}.tmp"
+        with open(temp_path, 'w') as f:
+            f.write(secrets.token_hex(32))
+            f.flush()
+            os.fsync(f.fileno())
+        os.chmod(temp_path, 0o600)
+        try:
+            os.link(temp_path, path)
+        except FileExistsError:
+            pass
+        finally:
+            os.remove(temp_path)
+
+    for _ in range(50):
+        with open(path, 'r') as f:
+            key = f.read().strip()
+        if key:
+            return key
+        time.sleep(0.1)
+    raise RuntimeError(f"Shared secret key file is empty: {path}")
@@ -0,0 +1,111 @@
+#!/usr/bin/env python3
+"""
+Upload Storage for B-Transfer
+Single-pass hashing/compression of uploads into local or cloud storage
+"""
+
+import time
+import hashlib
+
+from . import config
+from .cloud_storage import get_cloud_storage
+from .compression import choose_encoding, compress_stream
+from .integrity import ChunkHasher, HashingReader, HashingWriter, copy_with_manifest
+from .routing import SpillWriter, spooled_size
+
+
+class CloudUnavailable(IOError):
+    pass
+
+
+def save_upload(file, dst, encoding):
+    """Stream an upload into `dst` in one pass, hashing it and compressing when `encoding` is set
+
+    Returns metadata fields: original size/sha256, stored size and the chunk
+    manifest of the bytes at rest.
+    """
+    if not encoding:
+        manifest = copy_with_manifest(file.stream, dst)
+        return {
+            'size': manifest['size'],
+            'stored_size': manifest['size'],
+            'sha256': manifest['sha256'],
+            'manifest': manifest
+        }
+    
+    content_hash = hashlib.sha256()
+    stored_hash = ChunkHasher()
+    size, stored_size = compress_stream(HashingReader(file.stream, content_hash),
+                                        HashingWriter(dst, stored_hash), encoding)
+    return {
+        'size': size,
+        'stored_size': stored_size,
+        'sha256': content_hash.hexdigest(),
+        'manifest': stored_hash.manifest()
+    }
+
+
+def open_cloud_upload(name):
+    cloud_storage = get_cloud_storage()
+    return cloud_storage.start_resumable_upload(name) if cloud_storage else None
+
+
+def cloud_available():
+    cloud_storage = get_cloud_storage()
+    return bool(cloud_storage and cloud_storage.service)
+
+
+def store_upload(core, file, filename, encoding='auto', cloud_only=False):
+    """Write an upload under its reserved name, moving it to the cloud mid-stream if it gets large
+
+    Routing uses the bytes actually received, since browsers rarely send a
+    per-part Content-Length for multipart uploads. Form uploads are already
+    spooled, so their size picks the route up front; other streams switch
+    mid-stream. `encoding` skips the compressibility probe for streams that
+    can't be rewound. `cloud_only` (for spooled uploads when the disk is
+    full) fails rather than writing locally.
+    """
+    if encoding == 'auto':
+        encoding = None
+        if config.COMPRESS_UPLOADS:
+            encoding = choose_encoding(filename, file.stream, config.COMPRESSION_CODEC)
+    
+    stored = {
+        'storage_type': 'local',
+        'cloud_file_id': None,
+        'encoding': encoding
+    }
+    
+    router = core.upload_router
+    writer = SpillWriter(core.path(filename), filename, 0 if cloud_only else router.threshold(),
+                         open_cloud_upload, size=spooled_size(file.stream))
+    if cloud_only and not writer.in_cloud:
+        writer.abort()
+        raise CloudUnavailable(f"Cloud storage unavailable for {filename}")
+    try:
+        stored.update(save_upload(file, writer, encoding))
+        cloud_result = writer.close()
+    except Exception:
+        writer.abort()
+        if writer.in_cloud:
+            router.record_cloud_failure()
+        raise
+    
+    if writer.in_cloud:
+        # Verify against the checksum GCS computed
+        md5 = writer.md5_base64()
+        if cloud_result.get('md5Hash') != md5:
+            router.record_cloud_failure()
+            get_cloud_storage().delete_file(cloud_result['name'])
+            raise IOError(f"Cloud checksum mismatch for {filename}")
+        router.record_cloud(writer.size, time.time() - writer.started)
+        
+        # Objects are addressed by name; GCS's 'id' also carries the bucket and generation
+        stored['cloud_file_id'] = cloud_result['name']
+        stored['storage_type'] = 'cloud'
+        stored['manifest']['md5'] = md5
+        print(f"☁️ File streamed to cloud storage: {filename}")
+    
+    if encoding:
+        stored['compression_ratio'] = round(stored['stored_size'] / stored['size'], 3) if stored['size'] else 1.0
+    return stored
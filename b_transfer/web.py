@@ -0,0 +1,1359 @@
+#!/usr/bin/env python3
+"""
+Web Adapter for B-Transfer
+Flask blueprint and application factory shared by every deployment profile
+"""
+
+import os
+import json
+import time
+import hashlib
+import secrets
+import mimetypes
+from datetime import datetime, timedelta
+from flask import Flask, Blueprint, Request, current_app, request, jsonify, send_file, session, Response, redirect, g
+from werkzeug.exceptions import RequestEntityTooLarge
+from werkzeug.utils import secure_filename
+
+from . import config, listing
+from .admission import UPLOAD_BODY_LIMIT, UploadRejected, LimitedWriter, allowed_file, check_declared, declared_size
+from .cloud_storage import get_cloud_storage
+from .compression import decompress_chunks, accepts_encoding, compression_stats
+from .core import TransferCore
+from .crypto import encrypt_stream, decrypt_stream
+from .delta import DeltaError, PatchReader, PatchedFile, block_size_for, get_signature, open_plain_base
+from .integrity import ChunkHasher, HashingWriter, IntegrityError, rehash_first_chunk, digest_header
+from .previews import PreviewUnavailable, MIMETYPES
+from .relay import RelayError, RelayBusy
+from .scheduler import SchedulerBusy
+from .share_tokens import ShareTokenError
+from .shared_state import get_node_id
+from .signed_urls import get_url_signer, generate_signed_url
+from .storage import CloudUnavailable, cloud_available, store_upload
+
+bp = Blueprint('b_transfer', __name__)
+
+# Endpoints that count against the session's upload rate and cap
+RATE_LIMITED_ENDPOINTS = {
+    'b_transfer.upload_file', 'b_transfer.init_direct_upload', 'b_transfer.register_relay', 'b_transfer.delta_upload'
+}
+# Endpoints whose body is file content, with the largest body each accepts
+UPLOAD_BODY_LIMITS = {
+    'b_transfer.upload_file': UPLOAD_BODY_LIMIT,
+    'b_transfer.delta_upload': UPLOAD_BODY_LIMIT,
+    'b_transfer.send_relay': config.MAX_FILE_SIZE_PER_UPLOAD
+}
+
+
+class TransferRequest(Request):
+    """Request with per-endpoint body limits and a size-capped spool for multipart files
+
+    Werkzeug rejects a larger Content-Length before reading and stops
+    chunked bodies as soon as they pass the limit.
+    """
+
+    @property
+    def max_content_length(self):
+        return UPLOAD_BODY_LIMITS.get(self.endpoint, config.MAX_CONTENT_LENGTH)
+
+    def _get_file_stream(self, total_content_length, content_type, filename=None, content_length=None):
+        # Called with each part's headers, before any of its bytes are spooled
+        if filename and not allowed_file(filename):
+            raise UploadRejected('File type not allowed')
+        stream = super()._get_file_stream(total_content_length, content_type, filename, content_length)
+        return LimitedWriter(stream, config.MAX_FILE_SIZE_PER_UPLOAD)
+
+
+def current_core():
+    return current_app.extensions['b_transfer']
+
+
+def get_file_size(size_bytes):
+    if size_bytes == 0:
+        return "0 B"
+    size_names = ["B", "KB", "MB", "GB"]
+    i = 0
+    while size_bytes >= 1024 and i < len(size_names) - 1:
+        size_bytes /= 1024.0
+        i += 1
+    return f"{size_bytes:.1f} {size_names[i]}"
+
+def generate_session_id():
+    return hashlib.sha256(secrets.token_bytes(32)).hexdigest()[:16]
+
+def get_client_ip():
+    if request.headers.get('X-Forwarded-For'):
+        return request.headers.get('X-Forwarded-For').split(',')[0]
+    return request.remote_addr
+
+def log_security_event(event_type, details):
+    timestamp = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+    log_entry = f"[{timestamp}] {event_type}: {details} - IP: {get_client_ip()}\n"
+    
+    security_log = current_core().settings['security_log']
+    if not security_log:
+        print(log_entry)  # platform logs
+        return
+    with open(security_log, 'a') as f:
+        f.write(log_entry)
+
+@bp.before_app_request
+def security_check():
+    # Background maintenance: threads for the server profile, inline expiry for serverless
+    core = current_core()
+    if core.settings['background_tasks']:
+        core.start_background_tasks()
+    else:
+        core.maybe_sweep_expired()
+    
+    # Initialize session
+    if 'session_id' not in session:
+        session['session_id'] = generate_session_id()
+        session['upload_count'] = 0
+        session['last_upload'] = None
+    
+    # Upload admission, before any body byte is read
+    if request.endpoint in RATE_LIMITED_ENDPOINTS:
+        return admit_upload()
+
+def reject_upload(message, status):
+    """Error response for an upload refused before (or while) its body was read
+
+    Clients that sent `Expect: 100-continue` get this instead of the go-ahead,
+    so they never send the body.
+    """
+    response = jsonify({'error': message})
+    response.status_code = status
+    if request.content_length or request.headers.get('Transfer-Encoding'):
+        # The rest of the body is unread; don't reuse the connection
+        response.headers['Connection'] = 'close'
+    return response
+
+def admit_upload():
+    # Rate limiting
+    current_time = time.time()
+    if session.get('last_upload') and current_time - session['last_upload'] < 1:
+        log_security_event('RATE_LIMIT', f'Too many uploads from {get_client_ip()}')
+        return reject_upload('Rate limit exceeded. Please wait before uploading again.', 429)
+    
+    if session.get('upload_count', 0) >= config.MAX_UPLOADS_PER_SESSION:
+        log_security_event('UPLOAD_LIMIT', f'Upload limit exceeded from {get_client_ip()}')
+        return reject_upload('Upload limit reached for this session.', 429)
+    
+    # Declared name and size
+    if request.endpoint in UPLOAD_BODY_LIMITS:
+        try:
+            check_declared(request.headers, request.content_length, request.max_content_length)
+        except UploadRejected as e:
+            log_security_event('UPLOAD_REJECTED', f'{e} ({request.content_length} bytes)')
+            return reject_upload(str(e), e.status)
+        
+        # Bulk uploads wait for a slot, then read their body at the session's fair share
+        try:
+            ticket = schedule_transfer(current_core(), request.content_length or declared_size(request.headers))
+        except SchedulerBusy as e:
+            log_security_event('UPLOAD_BUSY', str(e))
+            response = reject_upload('Server busy with large transfers. Please retry shortly.', 503)
+            response.headers['Retry-After'] = str(config.BULK_QUEUE_TIMEOUT)
+            return response
+        if ticket:
+            g.transfer_ticket = ticket
+            request.environ['wsgi.input'] = ticket.reader(request.environ['wsgi.input'])
+
+@bp.teardown_app_request
+def release_transfer(exc):
+    # Upload bodies are fully read by now; download tickets are released when the response closes
+    ticket = g.pop('transfer_ticket', None)
+    if ticket:
+        ticket.release()
+
+def schedule_transfer(core, size):
+    """Scheduler ticket for a bulk transfer of `size` bytes (None if unknown), or None for small ones
+
+    Raises SchedulerBusy when no bulk slot frees up in time.
+    """
+    if core.scheduler is None or not core.scheduler.is_bulk(size):
+        return None
+    return core.scheduler.admit(session.get('session_id') or get_client_ip())
+
+def paced_response(response, ticket):
+    """Stream `response` at its session's fair share; the ticket is released when the body is closed"""
+    if ticket is None:
+        return response
+    if isinstance(response, tuple):
+        # Error before anything was sent
+        ticket.release()
+        return response
+    response.response = ticket.paced(response.response)
+    return response
+
+@bp.route('/')
+def index():
+    settings = current_core().settings
+    return jsonify({
+        'status': 'success',
+        'message': settings['message'],
+        'service': config.SERVICE_NAME,
+        'version': config.VERSION,
+        'deployment': settings['deployment'],
+        'endpoints': {
+            'health': '/health',
+            'files': '/files',
+            'events': '/events (text/event-stream)',
+            'upload': '/upload (POST)',
+            'direct_upload': '/upload/init (POST), /upload/finalize/<filename> (POST)',
+            'delta_upload': '/delta/<filename>/signature, /delta/<filename>?sha256=<hex> (POST)',
+            'download': '/download/<filename>',
+            'preview': '/preview/<filename>',
+            'delete': '/delete/<filename> (DELETE)',
+            'lock': '/lock/<filename> (POST)',
+            'unlock': '/unlock/<filename> (POST)',
+            'share': '/share/<filename> (POST), /s/<token>, /s/<token> (DELETE)',
+            'relay': '/relay/register (POST), /relay/<id>/send/<n> (POST), /relay/<id>/receive/<n>'
+        },
+        'timestamp': datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+    })
+
+@bp.route('/api/test')
+def api_test():
+    return jsonify({
+        'status': 'success',
+        'message': 'B-Transfer Flask API is working!',
+        'service': config.SERVICE_NAME,
+        'version': config.VERSION,
+        'timestamp': datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+    })
+
+def direct_transfer_backend():
+    """Cloud storage and URL signer for direct client<->GCS transfers, or None"""
+    cloud_storage = get_cloud_storage()
+    if not cloud_storage or not cloud_storage.service:
+        return None
+    signer = get_url_signer(cloud_storage)
+    return (cloud_storage, signer) if signer else None
+
+def send_stored_file(path, filename, metadata):
+    """Send a stored file, undoing at-rest compression unless the client accepts it
+
+    ETag/Digest describe the bytes actually sent when the upload recorded hashes.
+    """
+    encoding = metadata.get('encoding')
+    content_sha = metadata.get('sha256')
+    stored_sha = metadata.get('manifest', {}).get('sha256')
+    
+    if not encoding or accepts_encoding(request.headers.get('Accept-Encoding'), encoding):
+        # Serve the stored bytes as-is
+        response = send_file(path, as_attachment=True, download_name=filename, etag=stored_sha or True)
+        if encoding:
+            response.headers['Content-Encoding'] = encoding
+            response.headers['Vary'] = 'Accept-Encoding'
+        if stored_sha:
+            response.headers['Digest'] = digest_header(stored_sha)
+        return response
+    
+    response = Response(
+        decompress_chunks(open(path, 'rb'), encoding),
+        mimetype=mimetypes.guess_type(filename)[0] or 'application/octet-stream'
+    )
+    response.headers['Content-Disposition'] = f'attachment; filename="{filename}"'
+    response.headers['Content-Length'] = str(metadata.get('size', 0))
+    response.headers['Vary'] = 'Accept-Encoding'
+    if content_sha:
+        response.set_etag(content_sha)
+        response.headers['Digest'] = digest_header(content_sha)
+    return response
+
+def record_upload(core, filename, original_name, stored, reservation, **extra):
+    """Save metadata for a stored upload and announce it; returns the metadata"""
+    file_size = stored['size']
+    metadata = {
+        'original_name': original_name,
+        'upload_time': datetime.now().isoformat(),
+        'session_id': session['session_id'],
+        'is_locked': False,
+        'password_hash': None,
+        **stored,
+        **extra
+    }
+    core.save_metadata(filename, metadata)
+    local_size = stored['stored_size'] if stored['storage_type'] == 'local' else 0
+    core.capacity.commit(reservation, filename, local_size)
+    if stored['storage_type'] == 'local':
+        core.previews.submit(core.path(filename), filename, metadata)
+    core.publish('upload', filename, metadata)
+    
+    # Update session
+    session['upload_count'] = session.get('upload_count', 0) + 1
+    session['last_upload'] = time.time()
+    
+    # Log successful upload
+    log_security_event('UPLOAD_SUCCESS', f'{filename} ({get_file_size(file_size)})')
+    
+    print(f"✅ File uploaded: {filename} ({get_file_size(file_size)})")
+    return metadata
+
+@bp.route('/upload', methods=['POST'])
+def upload_file():
+    core = current_core()
+    reservation = None
+    try:
+        # Reserve disk space before the request body is parsed
+        reservation = core.capacity.reserve(request.content_length or declared_size(request.headers)
+                                            or config.UNKNOWN_UPLOAD_RESERVATION)
+        # A full disk can still take uploads that go straight to the cloud
+        cloud_only = reservation is None
+        if cloud_only and not cloud_available():
+            log_security_event('UPLOAD_ERROR', f'Insufficient storage for {request.content_length} bytes')
+            return reject_upload('Server storage is full. Please try again later.', 507)
+        
+        # Security checks
+        if 'file' not in request.files:
+            log_security_event('UPLOAD_ERROR', 'No file part in request')
+            return jsonify({'error': 'No file part'}), 400
+        
+        file = request.files['file']
+        if file.filename == '':
+            log_security_event('UPLOAD_ERROR', 'No file selected')
+            return jsonify({'error': 'No file selected'}), 400
+        
+        # Check file type
+        if not allowed_file(file.filename):
+            log_security_event('UPLOAD_ERROR', f'Invalid file type: {file.filename}')
+            return jsonify({'error': 'File type not allowed'}), 400
+        
+        # Secure filename
+        filename = secure_filename(file.filename)
+        if not filename:
+            log_security_event('UPLOAD_ERROR', 'Invalid filename')
+            return jsonify({'error': 'Invalid filename'}), 400
+        
+        # Handle duplicate filenames (atomic O_EXCL reservation, safe across workers)
+        filename = core.file_store.allocate_name(filename)
+        try:
+            stored = store_upload(core, file, filename, cloud_only=cloud_only)
+        except Exception:
+            # Release the reserved name
+            core.file_store.remove(filename)
+            raise
+        
+        metadata = record_upload(core, filename, file.filename, stored, reservation)
+        
+        return jsonify({
+            'status': 'success',
+            'filename': filename,
+            'size': metadata['size'],
+            'session_id': session['session_id'],
+            'is_locked': False
+        }), 200
+        
+    except UploadRejected as e:
+        log_security_event('UPLOAD_REJECTED', f'{e} (aborted mid-stream)')
+        return reject_upload(str(e), e.status)
+    except RequestEntityTooLarge:
+        log_security_event('UPLOAD_REJECTED', 'Request body too large (aborted mid-stream)')
+        return reject_upload('File too large', 413)
+    except CloudUnavailable as e:
+        log_security_event('UPLOAD_ERROR', str(e))
+        return reject_upload('Server storage is full. Please try again later.', 507)
+    except Exception as e:
+        log_security_event('UPLOAD_ERROR', f'Exception: {str(e)}')
+        print(f"❌ Upload error: {str(e)}")
+        return jsonify({'error': f'Upload failed: {str(e)}'}), 500
+    
+    finally:
+        if reservation is not None:
+            core.capacity.release(reservation)
+
+@bp.route('/upload/init', methods=['POST'])
+def init_direct_upload():
+    """Reserve a name and hand back a signed URL the client PUTs the file to"""
+    core = current_core()
+    try:
+        backend = direct_transfer_backend()
+        if not backend:
+            return jsonify({'error': 'Direct upload not available', 'fallback': '/upload'}), 503
+        cloud_storage, signer = backend
+        
+        data = request.get_json(silent=True) or {}
+        original_name = data.get('filename') or ''
+        size = data.get('size')
+        content_type = data.get('content_type') or 'application/octet-stream'
+        
+        if not allowed_file(original_name):
+            log_security_event('UPLOAD_ERROR', f'Invalid file type: {original_name}')
+            return jsonify({'error': 'File type not allowed'}), 400
+        
+        filename = secure_filename(original_name)
+        if not filename:
+            log_security_event('UPLOAD_ERROR', 'Invalid filename')
+            return jsonify({'error': 'Invalid filename'}), 400
+        
+        if not isinstance(size, int) or size <= 0:
+            return jsonify({'error': 'File size required'}), 400
+        if size > config.MAX_FILE_SIZE_PER_UPLOAD:
+            log_security_event('UPLOAD_ERROR', f'File too large: {original_name} ({get_file_size(size)})')
+            return jsonify({'error': 'File too large'}), 413
+        
+        # The local name reservation doubles as the catalog entry, as for proxied cloud uploads
+        filename = core.file_store.allocate_name(filename)
+        core.save_metadata(filename, {
+            'original_name': original_name,
+            'upload_time': datetime.now().isoformat(),
+            'session_id': session['session_id'],
+            'is_locked': False,
+            'password_hash': None,
+            'storage_type': 'cloud',
+            'cloud_file_id': filename,
+            'encoding': None,
+            'size': size,
+            'stored_size': size,
+            'content_type': content_type,
+            'status': 'pending'
+        })
+        
+        upload_url = generate_signed_url(signer, cloud_storage.bucket, filename, method='PUT',
+                                         expiration=config.SIGNED_URL_EXPIRATION, content_type=content_type)
+        
+        # Update session
+        session['upload_count'] = session.get('upload_count', 0) + 1
+        session['last_upload'] = time.time()
+        
+        log_security_event('UPLOAD_INIT', f'{filename} ({get_file_size(size)})')
+        
+        return jsonify({
+            'status': 'success',
+            'filename': filename,
+            'upload_url': upload_url,
+            'method': 'PUT',
+            'headers': {'Content-Type': content_type},
+            'expires_in': config.SIGNED_URL_EXPIRATION,
+            'finalize': f'/upload/finalize/{filename}'
+        }), 200
+        
+    except Exception as e:
+        log_security_event('UPLOAD_ERROR', f'Exception: {str(e)}')
+        print(f"❌ Upload init error: {str(e)}")
+        return jsonify({'error': f'Upload failed: {str(e)}'}), 500
+
+@bp.route('/upload/finalize/<filename>', methods=['POST'])
+def finalize_direct_upload(filename):
+    """Check the object the client uploaded and publish the file"""
+    core = current_core()
+    try:
+        backend = direct_transfer_backend()
+        if not backend:
+            return jsonify({'error': 'Direct upload not available'}), 503
+        cloud_storage, _ = backend
+        
+        data = request.get_json(silent=True) or {}
+        
+        with core.file_store.lock(filename):
+            metadata = core.load_metadata(filename)
+            if not metadata:
+                return jsonify({'error': 'File not found'}), 404
+            
+            if metadata.get('session_id') != session.get('session_id'):
+                log_security_event('UPLOAD_ERROR', f'Unauthorized finalize attempt: {filename}')
+                return jsonify({'error': 'You can only finalize your own uploads'}), 403
+            
+            if metadata.get('status') != 'pending':
+                return jsonify({'error': 'Upload already finalized'}), 400
+            
+            info = cloud_storage.get_object(metadata['cloud_file_id'])
+            if not info:
+                return jsonify({'error': 'Uploaded object not found'}), 409
+            
+            # The object must match what was declared at init (and the client's MD5 if sent)
+            error = None
+            if int(info.get('size', 0)) != metadata['size']:
+                error = 'Uploaded size does not match'
+            elif data.get('md5') and data['md5'] != info.get('md5Hash'):
+                error = 'Uploaded checksum does not match'
+            if error:
+                log_security_event('UPLOAD_ERROR', f'{error}: {filename}')
+                cloud_storage.delete_file(metadata['cloud_file_id'])
+                core.remove_local(filename)
+                return jsonify({'error': error}), 400
+            
+            del metadata['status']
+            metadata['manifest'] = {'size': metadata['size'], 'md5': info.get('md5Hash')}
+            core.save_metadata(filename, metadata)
+            core.publish('upload', filename, metadata)
+        
+        log_security_event('UPLOAD_SUCCESS', f'{filename} ({get_file_size(metadata["size"])}, direct)')
+        print(f"✅ File uploaded directly to cloud: {filename} ({get_file_size(metadata['size'])})")
+        
+        return jsonify({
+            'status': 'success',
+            'filename': filename,
+            'size': metadata['size'],
+            'session_id': session['session_id'],
+            'is_locked': False
+        }), 200
+        
+    except Exception as e:
+        log_security_event('UPLOAD_ERROR', f'Exception: {str(e)}')
+        print(f"❌ Upload finalize error: {str(e)}")
+        return jsonify({'error': f'Upload failed: {str(e)}'}), 500
+
+def delta_base_metadata(core, filename):
+    """(metadata, None) for a file usable as a delta base, else (None, error response)"""
+    metadata = core.load_metadata(filename)
+    if not metadata or metadata.get('status') == 'pending':
+        return None, (jsonify({'error': 'File not found'}), 404)
+    if metadata.get('is_locked'):
+        return None, (jsonify({'error': 'File is locked. Please unlock it first.'}), 403)
+    if metadata.get('storage_type') == 'cloud' or not metadata.get('sha256'):
+        return None, (jsonify({'error': 'Delta uploads need a locally stored base file'}), 400)
+    return metadata, None
+
+@bp.route('/delta/<filename>/signature')
+def delta_signature(filename):
+    """Block signature of a stored file for building a delta against it"""
+    core = current_core()
+    try:
+        metadata, error = delta_base_metadata(core, filename)
+        if error:
+            return error
+        
+        path = get_signature(core.file_store, core.path(filename), metadata)
+        response = send_file(path, mimetype='application/octet-stream', etag=metadata['sha256'])
+        response.headers['X-Block-Size'] = str(block_size_for(metadata['size']))
+        response.headers['Cache-Control'] = 'private, max-age=3600'
+        return response
+        
+    except FileNotFoundError:
+        return jsonify({'error': 'File not found'}), 404
+    except Exception as e:
+        print(f"❌ Signature error: {str(e)}")
+        return jsonify({'error': 'Signature failed'}), 500
+
+@bp.route('/delta/<filename>', methods=['POST'])
+def delta_upload(filename):
+    """Store a new version of `filename` rebuilt from the old file and the delta in the body"""
+    core = current_core()
+    reservation = None
+    base = temp_path = None
+    try:
+        expected_sha256 = request.args.get('sha256', '').lower()
+        if len(expected_sha256) != 64:
+            return jsonify({'error': 'sha256 of the new version is required'}), 400
+        
+        metadata, error = delta_base_metadata(core, filename)
+        if error:
+            return error
+        
+        # The new version is at most the old file plus the literal data sent
+        reservation = core.capacity.reserve(metadata['size'] + (request.content_length or config.UNKNOWN_UPLOAD_RESERVATION))
+        if reservation is None:
+            log_security_event('UPLOAD_ERROR', f'Insufficient storage for delta of {filename}')
+            return reject_upload('Server storage is full. Please try again later.', 507)
+        
+        new_name = core.file_store.allocate_name(filename)
+        try:
+            # An open handle keeps reading the old bytes even if the base is replaced meanwhile
+            base, temp_path = open_plain_base(core.file_store, core.path(filename), metadata.get('encoding'),
+                                              f".staging/delta-{new_name}")
+            reader = PatchReader(base, metadata['size'], request.stream, config.MAX_FILE_SIZE_PER_UPLOAD)
+            stored = store_upload(core, PatchedFile(reader), new_name, encoding=metadata.get('encoding'))
+            if stored['sha256'] != expected_sha256:
+                if stored['storage_type'] == 'cloud':
+                    get_cloud_storage().delete_file(stored['cloud_file_id'])
+                raise DeltaError('Reconstructed file does not match sha256')
+        except Exception:
+            # Release the reserved name
+            core.file_store.remove(new_name)
+            raise
+        
+        new_metadata = record_upload(core, new_name, metadata.get('original_name', filename), stored, reservation,
+                                     delta_base=filename)
+        log_security_event('DELTA_UPLOAD', f'{new_name} from {filename}: {get_file_size(reader.literal)} sent, '
+                                           f'{get_file_size(reader.copied)} reused')
+        
+        return jsonify({
+            'status': 'success',
+            'filename': new_name,
+            'size': new_metadata['size'],
+            'session_id': session['session_id'],
+            'is_locked': False,
+            'delta_base': filename,
+            'bytes_sent': reader.literal,
+            'bytes_reused': reader.copied
+        }), 200
+        
+    except DeltaError as e:
+        log_security_event('UPLOAD_ERROR', f'Bad delta for {filename}: {e}')
+        return jsonify({'error': str(e)}), 400
+    except RequestEntityTooLarge:
+        log_security_event('UPLOAD_REJECTED', f'Delta for {filename} too large (aborted mid-stream)')
+        return reject_upload('File too large', 413)
+    except Exception as e:
+        log_security_event('UPLOAD_ERROR', f'Exception: {str(e)}')
+        print(f"❌ Delta upload error: {str(e)}")
+        return jsonify({'error': f'Upload failed: {str(e)}'}), 500
+    
+    finally:
+        if reservation is not None:
+            core.capacity.release(reservation)
+        if base is not None:
+            base.close()
+        if temp_path:
+            os.remove(temp_path)
+
+@bp.route('/lock/<filename>', methods=['POST'])
+def lock_file(filename):
+    core = current_core()
+    try:
+        data = request.get_json()
+        password = data.get('password')
+        
+        if not password or len(password) < 4:
+            return jsonify({'error': 'Password must be at least 4 characters'}), 400
+        
+        filepath = core.path(filename)
+        if not os.path.exists(filepath):
+            return jsonify({'error': 'File not found'}), 404
+        
+        with core.file_store.lock(filename):
+            # Decide from the header record; the full metadata is only needed to lock
+            header = core.file_header(filename)
+            if not header:
+                return jsonify({'error': 'File metadata not found'}), 404
+            
+            # Check if user owns the file
+            if not header.owned_by(session.get('session_id')):
+                log_security_event('LOCK_ERROR', f'Unauthorized lock attempt: {filename}')
+                return jsonify({'error': 'You can only lock your own files'}), 403
+            
+            if header.is_locked:
+                return jsonify({'error': 'File is already locked'}), 400
+            
+            # Cloud files only have an empty local name reservation to encrypt
+            if header.is_cloud:
+                return jsonify({'error': 'Only locally stored files can be locked'}), 400
+            
+            metadata = core.load_metadata(filename)
+            
+            # Encrypt chunk by chunk into a staging file that atomically
+            # replaces the original, so a crash never leaves it truncated.
+            # The ciphertext is hashed as it's written so the scrubber can
+            # verify the locked file without the password; only the first
+            # chunk is re-read once the MAC is in the header.
+            hasher = ChunkHasher(whole=False)
+            with open(filepath, 'rb') as src, core.file_store.atomic_writer(filename) as f:
+                salt = encrypt_stream(src, f, password, hasher=hasher)
+            
+            # Update metadata
+            if 'manifest' in metadata:
+                metadata['unlocked_sha256'] = metadata['manifest']['sha256']
+                metadata['manifest'] = rehash_first_chunk(hasher.manifest(), filepath)
+            metadata['is_locked'] = True
+            metadata['password_hash'] = hashlib.sha256(password.encode()).hexdigest()
+            metadata['kdf_salt'] = salt.hex()
+            core.save_metadata(filename, metadata)
+            core.capacity.record_update(filename, os.path.getsize(filepath), locked=True)
+            core.publish('lock', filename, metadata)
+        
+        log_security_event('LOCK_SUCCESS', filename)
+        print(f"🔒 File locked: {filename}")
+        
+        return jsonify({
+            'status': 'success',
+            'message': 'File locked successfully'
+        }), 200
+        
+    except Exception as e:
+        log_security_event('LOCK_ERROR', f'Exception: {str(e)}')
+        print(f"❌ Lock error: {str(e)}")
+        return jsonify({'error': f'Lock failed: {str(e)}'}), 500
+
+@bp.route('/unlock/<filename>', methods=['POST'])
+def unlock_file(filename):
+    core = current_core()
+    try:
+        data = request.get_json()
+        password = data.get('password')
+        
+        if not password:
+            return jsonify({'error': 'Password required'}), 400
+        
+        filepath = core.path(filename)
+        if not os.path.exists(filepath):
+            return jsonify({'error': 'File not found'}), 404
+        
+        with core.file_store.lock(filename):
+            header = core.file_header(filename)
+            if not header:
+                return jsonify({'error': 'File metadata not found'}), 404
+            
+            # Check if file is locked
+            if not header.is_locked:
+                return jsonify({'error': 'File is not locked'}), 400
+            
+            metadata = core.load_metadata(filename)
+            
+            # Verify password
+            password_hash = hashlib.sha256(password.encode()).hexdigest()
+            if metadata.get('password_hash') != password_hash:
+                log_security_event('UNLOCK_ERROR', f'Wrong password for: {filename}')
+                return jsonify({'error': 'Incorrect password'}), 401
+            
+            # Decrypt chunk by chunk into a staging file, hashing the plaintext on
+            # the way; it only replaces the locked file once the MAC and the hash
+            # recorded before locking both check out
+            hasher = ChunkHasher()
+            try:
+                with open(filepath, 'rb') as src, core.file_store.atomic_writer(filename) as f:
+                    decrypt_stream(src, HashingWriter(f, hasher), password)
+                    manifest = hasher.manifest()
+                    if 'manifest' in metadata and metadata.get('unlocked_sha256') not in (None, manifest['sha256']):
+                        raise IntegrityError(filename)
+            except IntegrityError:
+                log_security_event('UNLOCK_ERROR', f'Integrity check failed: {filename}')
+                return jsonify({'error': 'File failed integrity check'}), 500
+            except ValueError as e:
+                log_security_event('UNLOCK_ERROR', f'Decryption failed: {filename}')
+                return jsonify({'error': 'Incorrect password or corrupted file'}), 401
+            
+            if 'manifest' in metadata:
+                metadata['manifest'] = manifest
+                metadata.pop('unlocked_sha256', None)
+            
+            # Update metadata
+            metadata['is_locked'] = False
+            metadata['password_hash'] = None
+            metadata.pop('kdf_salt', None)
+            core.save_metadata(filename, metadata)
+            core.capacity.record_update(filename, hasher.size, locked=False)
+            core.publish('unlock', filename, metadata)
+        
+        log_security_event('UNLOCK_SUCCESS', filename)
+        print(f"🔓 File unlocked: {filename}")
+        
+        return jsonify({
+            'status': 'success',
+            'message': 'File unlocked successfully'
+        }), 200
+        
+    except Exception as e:
+        log_security_event('UNLOCK_ERROR', f'Exception: {str(e)}')
+        print(f"❌ Unlock error: {str(e)}")
+        return jsonify({'error': f'Unlock failed: {str(e)}'}), 500
+
+@bp.route('/files')
+def list_files():
+    try:
+        return jsonify(listing.list_files(current_core(), session.get('session_id')))
+        
+    except Exception as e:
+        log_security_event('LIST_ERROR', f'Exception: {str(e)}')
+        print(f"❌ List files error: {str(e)}")
+        return jsonify({'error': 'Failed to list files'}), 500
+
+def serve_download(core, filename, metadata, signed_redirect=True):
+    """Send a file to the client from local or cloud storage
+
+    `signed_redirect=False` streams cloud files through this server: a signed
+    URL can be fetched any number of times until it expires.
+    """
+    # Check if file is locked
+    if metadata.get('is_locked'):
+        return jsonify({'error': 'File is locked. Please unlock it first.'}), 403
+    
+    # Refuse files the scrubber found corrupted
+    if metadata.get('corrupt_chunk') is not None:
+        log_security_event('DOWNLOAD_ERROR', f'Corrupted file: {filename}')
+        return jsonify({'error': 'File failed integrity check'}), 500
+    
+    storage_type = metadata.get('storage_type', 'local')
+    
+    if storage_type == 'cloud':
+        # Send the client straight to GCS with a short-lived signed URL
+        # (objects compressed at rest still go through send_stored_file)
+        backend = direct_transfer_backend() if signed_redirect else None
+        if backend and metadata.get('cloud_file_id') and not metadata.get('encoding'):
+            cloud_storage, signer = backend
+            download_url = generate_signed_url(
+                signer, cloud_storage.bucket, metadata['cloud_file_id'], method='GET',
+                expiration=config.SIGNED_URL_EXPIRATION,
+                query_params={'response-content-disposition': f'attachment; filename="{filename}"'}
+            )
+            log_security_event('DOWNLOAD_SUCCESS', f'{filename} (cloud, signed URL)')
+            response = redirect(download_url, code=302)
+            response.headers['Cache-Control'] = 'no-store'
+            return response
+    
+    # Bulk downloads wait for a slot and share bandwidth fairly per session
+    try:
+        ticket = schedule_transfer(core, metadata.get('size'))
+    except SchedulerBusy as e:
+        log_security_event('DOWNLOAD_BUSY', f'{filename}: {e}')
+        response = jsonify({'error': 'Server busy with large transfers. Please retry shortly.'})
+        response.status_code = 503
+        response.headers['Retry-After'] = str(config.BULK_QUEUE_TIMEOUT)
+        return response
+    try:
+        response = send_download(core, filename, metadata, storage_type)
+    except Exception:
+        if ticket:
+            ticket.release()
+        raise
+    return paced_response(response, ticket)
+
+def send_download(core, filename, metadata, storage_type):
+    """Stream a file from local storage, or from the cloud through this server"""
+    if storage_type == 'cloud':
+        # Download from cloud storage through this server
+        cloud_storage = get_cloud_storage()
+        if not cloud_storage:
+            return jsonify({'error': 'Cloud storage not available'}), 500
+        
+        cloud_file_id = metadata.get('cloud_file_id')
+        if not cloud_file_id:
+            return jsonify({'error': 'Cloud file ID not found'}), 404
+        
+        # Download from cloud
+        cloud_result = cloud_storage.download_file(cloud_file_id)
+        if not cloud_result:
+            return jsonify({'error': 'Failed to download from cloud'}), 500
+        
+        # Create temporary file
+        temp_path = core.path(f"temp_download_{filename}")
+        with open(temp_path, 'wb') as f:
+            f.write(cloud_result['content'])
+        
+        log_security_event('DOWNLOAD_SUCCESS', f'{filename} (cloud)')
+        print(f"📥 File downloaded from cloud: {filename}")
+        
+        # Return file and clean up after sending
+        response = send_stored_file(temp_path, filename, metadata)
+        
+        # Clean up temp file after response
+        def cleanup():
+            try:
+                os.remove(temp_path)
+            except:
+                pass
+        
+        response.call_on_close(cleanup)
+        return response
+    
+    else:
+        # Local file download
+        filepath = core.path(filename)
+        if not os.path.exists(filepath) or not os.path.isfile(filepath):
+            log_security_event('DOWNLOAD_ERROR', f'File not found: {filename}')
+            return jsonify({'error': 'File not found'}), 404
+        
+        log_security_event('DOWNLOAD_SUCCESS', filename)
+        print(f"📥 File downloaded: {filename}")
+        return send_stored_file(filepath, filename, metadata)
+
+def event_streams_allowed(environ):
+    """A stream holds its worker for minutes, so a few tabs would take every sync (single-threaded) worker"""
+    if config.EVENT_STREAMS == 'auto':
+        return bool(environ.get('wsgi.multithread'))
+    return config.EVENT_STREAMS == '1'
+
+def format_event(core, event, session_id):
+    """One SSE message; rows are rendered per session so is_owner is right for each client"""
+    if event.metadata is None:
+        data = {'name': event.filename}
+    else:
+        data = listing.file_entry(event.filename, event.metadata, event.size, session_id)
+    return f"id: {core.events.event_id(event)}\nevent: {event.type}\ndata: {json.dumps(data)}\n\n"
+
+@bp.route('/events')
+def file_events():
+    """Server-sent file changes; resumes from Last-Event-ID out of the replay buffer"""
+    core = current_core()
+    if not core.settings['events'] or not event_streams_allowed(request.environ):
+        return jsonify({'error': 'Event stream not available', 'fallback': '/files'}), 404
+    
+    session_id = session.get('session_id')
+    last_event_id = request.headers.get('Last-Event-ID') or request.args.get('last_event_id')
+    cursor = core.events.resume_point(last_event_id)
+    
+    def stream():
+        nonlocal cursor
+        yield "retry: 3000\n\n"
+        
+        # Bounded lifetime frees the server thread; EventSource reconnects with Last-Event-ID
+        deadline = time.time() + config.EVENT_STREAM_LIFETIME
+        while time.time() < deadline:
+            if cursor is None:
+                # Too far behind (the log moved on to a new generation): reload /files, then follow
+                cursor = core.events.current()
+                yield f"id: {core.events.cursor_id(cursor)}\nevent: reset\ndata: {{}}\n\n"
+            events = core.events.wait(cursor, config.EVENT_KEEPALIVE)
+            if events is None:
+                cursor = None
+                continue
+            if not events:
+                yield ": keepalive\n\n"
+                continue
+            for event in events:
+                cursor = (event.epoch, event.seq)
+                yield format_event(core, event, session_id)
+    
+    response = Response(stream(), mimetype='text/event-stream')
+    response.headers['Cache-Control'] = 'no-cache'
+    response.headers['X-Accel-Buffering'] = 'no'  # don't let nginx buffer the stream
+    return response
+
+@bp.route('/download/<filename>')
+def download_file(filename):
+    core = current_core()
+    try:
+        # Load metadata
+        metadata = core.load_metadata(filename)
+        if not metadata or metadata.get('status') == 'pending':
+            log_security_event('DOWNLOAD_ERROR', f'File not found: {filename}')
+            return jsonify({'error': 'File not found'}), 404
+        
+        return serve_download(core, filename, metadata)
+        
+    except Exception as e:
+        log_security_event('DOWNLOAD_ERROR', f'Exception: {str(e)}')
+        print(f"❌ Download error: {str(e)}")
+        return jsonify({'error': 'Download failed'}), 500
+
+def delete_stored_file(core, filename, metadata):
+    """Delete a file from its storage backend; caller holds the file lock"""
+    if metadata.get('storage_type', 'local') == 'cloud':
+        # Delete from cloud storage
+        cloud_storage = get_cloud_storage()
+        if cloud_storage:
+            cloud_file_id = metadata.get('cloud_file_id')
+            if cloud_file_id:
+                cloud_storage.delete_file(cloud_file_id)
+    
+    # Delete local file (or cloud name reservation) and metadata
+    core.remove_local(filename)
+
+@bp.route('/preview/<filename>')
+def preview_file(filename):
+    """Thumbnail or text snippet; immutable when requested with the listing's ?v= version"""
+    core = current_core()
+    try:
+        metadata = core.load_metadata(filename)
+        if not metadata or metadata.get('status') == 'pending':
+            return jsonify({'error': 'File not found'}), 404
+        
+        # Locked files are ciphertext at rest, cloud files have no local bytes to render
+        if metadata.get('is_locked'):
+            return jsonify({'error': 'File is locked. Please unlock it first.'}), 403
+        if metadata.get('storage_type') == 'cloud' or not metadata.get('sha256'):
+            return jsonify({'error': 'Preview not available'}), 404
+        
+        try:
+            path = core.previews.get_or_render(core.path(filename), filename, metadata)
+        except PreviewUnavailable as e:
+            return jsonify({'error': 'Preview not available', 'reason': str(e)}), 404
+        
+        if path is None:
+            response = jsonify({'status': 'pending'})
+            response.status_code = 202
+            response.headers['Retry-After'] = '1'
+            return response
+        
+        ext = path.rsplit('.', 1)[-1]
+        response = send_file(path, mimetype=MIMETYPES[ext], etag=metadata['sha256'])
+        if request.args.get('v') == metadata['sha256'][:16]:
+            # Content-addressed URL: a different upload gets a different ?v=
+            response.headers['Cache-Control'] = 'public, max-age=31536000, immutable'
+        else:
+            response.headers['Cache-Control'] = 'public, max-age=300'
+        return response
+        
+    except FileNotFoundError:
+        return jsonify({'error': 'File not found'}), 404
+    except Exception as e:
+        print(f"❌ Preview error: {str(e)}")
+        return jsonify({'error': 'Preview failed'}), 500
+
+@bp.route('/delete/<filename>', methods=['DELETE'])
+def delete_file(filename):
+    core = current_core()
+    try:
+        filepath = core.path(filename)
+        if not os.path.exists(filepath) or not os.path.isfile(filepath):
+            log_security_event('DELETE_ERROR', f'File not found: {filename}')
+            return jsonify({'error': 'File not found'}), 404
+        
+        with core.file_store.lock(filename):
+            header = core.file_header(filename)
+            if not header:
+                log_security_event('DELETE_ERROR', f'File metadata not found: {filename}')
+                return jsonify({'error': 'File metadata not found'}), 404
+            
+            # Check if user owns the file
+            if not header.owned_by(session.get('session_id')):
+                log_security_event('DELETE_ERROR', f'Unauthorized delete attempt: {filename}')
+                return jsonify({'error': 'You can only delete your own files'}), 403
+            
+            # Unlocked local files are deleted from the header record alone
+            metadata = {'storage_type': 'local'}
+            if header.is_locked or header.is_cloud:
+                metadata = core.load_metadata(filename) or metadata
+            
+            # Check if file is locked and requires password
+            if header.is_locked:
+                data = request.get_json()
+                password = data.get('password') if data else None
+                
+                if not password:
+                    log_security_event('DELETE_ERROR', f'Password required for locked file: {filename}')
+                    return jsonify({'error': 'Password required to delete locked file'}), 401
+                
+                # Verify password
+                password_hash = hashlib.sha256(password.encode()).hexdigest()
+                if metadata.get('password_hash') != password_hash:
+                    log_security_event('DELETE_ERROR', f'Wrong password for locked file: {filename}')
+                    return jsonify({'error': 'Incorrect password'}), 401
+            
+            delete_stored_file(core, filename, metadata)
+            core.publish('delete', filename)
+        
+        log_security_event('DELETE_SUCCESS', filename)
+        print(f"🗑️ File deleted: {filename}")
+        return jsonify({'status': 'success', 'message': 'File deleted successfully'})
+        
+    except Exception as e:
+        log_security_event('DELETE_ERROR', f'Exception: {str(e)}')
+        print(f"❌ Delete error: {str(e)}")
+        return jsonify({'error': 'Delete failed'}), 500
+
+@bp.route('/share/<filename>', methods=['POST'])
+def share_file(filename):
+    """Create a signed, expiring share link for one of the session's files"""
+    core = current_core()
+    try:
+        data = request.get_json(silent=True) or {}
+        metadata = core.load_metadata(filename)
+        if not metadata or metadata.get('status') == 'pending':
+            return jsonify({'error': 'File not found'}), 404
+        
+        if metadata.get('session_id') != session.get('session_id'):
+            log_security_event('SHARE_ERROR', f'Unauthorized share attempt: {filename}')
+            return jsonify({'error': 'You can only share your own files'}), 403
+        
+        permissions = data.get('permissions', 'r')
+        max_downloads = data.get('max_downloads')
+        expires_in = data.get('expires_in', config.FILE_LIFETIME)
+        if max_downloads is not None and (not isinstance(max_downloads, int) or max_downloads < 1):
+            return jsonify({'error': 'max_downloads must be a positive integer'}), 400
+        if not isinstance(expires_in, int) or expires_in <= 0:
+            return jsonify({'error': 'expires_in must be a positive number of seconds'}), 400
+        
+        # Links never outlive the file itself
+        file_expires = datetime.fromisoformat(metadata['upload_time']).timestamp() + config.FILE_LIFETIME
+        expires_at = min(time.time() + expires_in, file_expires)
+        
+        try:
+            token = core.share_tokens.issue(filename, metadata['upload_time'], expires_at,
+                                            permissions, max_downloads)
+        except ShareTokenError as e:
+            return jsonify({'error': str(e)}), 400
+        
+        log_security_event('SHARE_CREATED', f'{filename} ({permissions}, {max_downloads or "unlimited"} downloads)')
+        
+        return jsonify({
+            'status': 'success',
+            'token': token,
+            'url': f'/s/{token}',
+            'expires_at': datetime.fromtimestamp(expires_at).isoformat(),
+            'permissions': permissions,
+            'max_downloads': max_downloads
+        }), 200
+        
+    except Exception as e:
+        log_security_event('SHARE_ERROR', f'Exception: {str(e)}')
+        print(f"❌ Share error: {str(e)}")
+        return jsonify({'error': 'Share failed'}), 500
+
+def shared_file_metadata(core, claims):
+    """Metadata of the upload a token was issued for, or None if it's gone"""
+    metadata = core.load_metadata(claims['filename'])
+    # Deleted, or deleted and re-uploaded under the same name, since the link was made
+    if not metadata or metadata.get('upload_time') != claims['file_version']:
+        return None
+    return metadata
+
+@bp.route('/s/<token>')
+def download_shared(token):
+    core = current_core()
+    try:
+        claims = core.share_tokens.verify(token, 'r')
+    except ShareTokenError as e:
+        log_security_event('SHARE_DENIED', str(e))
+        return jsonify({'error': str(e)}), 403
+    
+    consumed = False
+    try:
+        filename = claims['filename']
+        metadata = shared_file_metadata(core, claims)
+        if not metadata:
+            return jsonify({'error': 'Shared file no longer exists'}), 404
+        
+        if metadata.get('is_locked'):
+            return jsonify({'error': 'File is locked. Please unlock it first.'}), 403
+        
+        # Counted up front so concurrent requests can't overrun the limit,
+        # and given back if the file isn't actually sent
+        if not core.share_tokens.consume(claims):
+            log_security_event('SHARE_DENIED', f'Download limit reached: {filename}')
+            return jsonify({'error': 'Download limit reached for this link'}), 410
+        consumed = True
+        
+        # A counted link must not hand out a reusable signed URL
+        response = serve_download(core, filename, metadata, signed_redirect=not claims['max_downloads'])
+        status = response[1] if isinstance(response, tuple) else response.status_code
+        if status >= 400:
+            core.share_tokens.refund(claims)
+        return response
+        
+    except Exception as e:
+        if consumed:
+            core.share_tokens.refund(claims)
+        log_security_event('DOWNLOAD_ERROR', f'Exception: {str(e)}')
+        print(f"❌ Shared download error: {str(e)}")
+        return jsonify({'error': 'Download failed'}), 500
+
+@bp.route('/s/<token>', methods=['DELETE'])
+def delete_shared(token):
+    core = current_core()
+    try:
+        claims = core.share_tokens.verify(token, 'd')
+    except ShareTokenError as e:
+        log_security_event('SHARE_DENIED', str(e))
+        return jsonify({'error': str(e)}), 403
+    
+    try:
+        filename = claims['filename']
+        with core.file_store.lock(filename):
+            metadata = shared_file_metadata(core, claims)
+            if not metadata:
+                return jsonify({'error': 'Shared file no longer exists'}), 404
+            
+            # A link can't stand in for the lock password
+            if metadata.get('is_locked'):
+                return jsonify({'error': 'File is locked'}), 403
+            
+            delete_stored_file(core, filename, metadata)
+            core.publish('delete', filename)
+        
+        log_security_event('DELETE_SUCCESS', f'{filename} (share link)')
+        print(f"🗑️ File deleted: {filename}")
+        return jsonify({'status': 'success', 'message': 'File deleted successfully'})
+        
+    except Exception as e:
+        log_security_event('DELETE_ERROR', f'Exception: {str(e)}')
+        print(f"❌ Delete error: {str(e)}")
+        return jsonify({'error': 'Delete failed'}), 500
+
+def relay_hub():
+    """The relay registry, or None where sender and receiver could land on different processes"""
+    if request.environ.get('wsgi.multiprocess'):
+        return None
+    return current_core().relay
+
+def relay_stream(transfer_id, index):
+    """Look up a relay transfer and one of its streams, or raise RelayError"""
+    hub = relay_hub()
+    if not hub:
+        raise RelayError('Relay mode not available')
+    transfer = hub.get(transfer_id)
+    return hub, transfer, transfer.stream(index)
+
+@bp.route('/relay/register', methods=['POST'])
+def register_relay():
+    """Sender announces a transfer; the receiver fetches it by id over the LAN"""
+    core = current_core()
+    try:
+        if not relay_hub():
+            return jsonify({'error': 'Relay mode not available', 'fallback': '/upload'}), 404
+        
+        data = request.get_json(silent=True) or {}
+        original_name = data.get('filename') or ''
+        if not allowed_file(original_name):
+            log_security_event('RELAY_ERROR', f'Invalid file type: {original_name}')
+            return jsonify({'error': 'File type not allowed'}), 400
+        
+        filename = secure_filename(original_name)
+        if not filename:
+            return jsonify({'error': 'Invalid filename'}), 400
+        
+        size = data.get('size')
+        streams = data.get('streams', 1)
+        if not isinstance(streams, int):
+            return jsonify({'error': 'Invalid stream count'}), 400
+        
+        try:
+            transfer = core.relay.register(filename, size, session['session_id'], streams)
+        except RelayBusy as e:
+            return jsonify({'error': str(e)}), 429
+        except RelayError as e:
+            return jsonify({'error': str(e)}), 400
+        
+        session['upload_count'] = session.get('upload_count', 0) + 1
+        session['last_upload'] = time.time()
+        log_security_event('RELAY_REGISTER', f'{filename} ({streams} streams)')
+        
+        return jsonify({
+            'status': 'success',
+            'transfer_id': transfer.id,
+            'filename': filename,
+            'streams': streams,
+            'send': [f'/relay/{transfer.id}/send/{i}' for i in range(streams)],
+            'receive': [f'/relay/{transfer.id}/receive/{i}' for i in range(streams)]
+        }), 200
+        
+    except Exception as e:
+        log_security_event('RELAY_ERROR', f'Exception: {str(e)}')
+        print(f"❌ Relay register error: {str(e)}")
+        return jsonify({'error': 'Relay registration failed'}), 500
+
+@bp.route('/relay/<transfer_id>')
+def relay_info(transfer_id):
+    try:
+        _, transfer, _ = relay_stream(transfer_id, 0)
+    except RelayError as e:
+        return jsonify({'error': str(e)}), 404
+    return jsonify({
+        'transfer_id': transfer.id,
+        'filename': transfer.filename,
+        'size': transfer.size,
+        'streams': [{'index': s.index, 'mode': s.mode, 'delivered': s.delivered} for s in transfer.streams]
+    })
+
+@bp.route('/relay/<transfer_id>/send/<int:index>', methods=['POST', 'PUT'])
+def send_relay(transfer_id, index):
+    """Pipe the request body to the receiver, or spool it if none connects in time"""
+    core = current_core()
+    try:
+        hub, transfer, stream = relay_stream(transfer_id, index)
+    except RelayError as e:
+        return jsonify({'error': str(e)}), 404
+    
+    if transfer.session_id != session.get('session_id'):
+        log_security_event('RELAY_ERROR', f'Unauthorized send attempt: {transfer.filename}')
+        return jsonify({'error': 'You can only send your own transfers'}), 403
+    
+    if request.content_length is None:
+        return jsonify({'error': 'Content-Length required'}), 411
+    if request.content_length > config.MAX_FILE_SIZE_PER_UPLOAD:
+        return reject_upload('File too large', 413)
+    
+    try:
+        stream.start_send()
+    except RelayError as e:
+        return jsonify({'error': str(e)}), 409
+    
+    try:
+        mode = stream.choose_mode(config.RELAY_WAIT_TIMEOUT)
+        if mode == 'pipe':
+            stream.pipe(request.stream, config.RELAY_IDLE_TIMEOUT)
+        else:
+            # Store-and-forward holds disk space until the receiver collects it or it expires
+            stream.reservation = core.capacity.reserve(request.content_length)
+            if stream.reservation is None:
+                stream.fail('Server storage is full')
+                return jsonify({'error': 'Server storage is full. Please try again later.'}), 507
+            stream.spool(request.stream)
+        hub.record(stream)
+        
+    except RelayError as e:
+        log_security_event('RELAY_ERROR', f'{transfer.filename}: {e}')
+        return jsonify({'error': str(e)}), 504
+    except Exception as e:
+        log_security_event('RELAY_ERROR', f'Exception: {str(e)}')
+        print(f"❌ Relay send error: {str(e)}")
+        return jsonify({'error': 'Relay send failed'}), 500
+    
+    log_security_event('RELAY_SEND', f'{transfer.filename} stream {index} ({get_file_size(stream.bytes)}, {mode})')
+    return jsonify({'status': 'success', 'mode': mode, 'bytes': stream.bytes}), 200
+
+@bp.route('/relay/<transfer_id>/receive/<int:index>')
+def receive_relay(transfer_id, index):
+    """Stream one part of a relay transfer to the receiver as the sender delivers it"""
+    try:
+        hub, transfer, stream = relay_stream(transfer_id, index)
+    except RelayError as e:
+        return jsonify({'error': str(e)}), 404
+    try:
+        stream.attach_receiver()
+    except RelayError as e:
+        return jsonify({'error': str(e)}), 409
+    
+    def generate():
+        completed = False
+        try:
+            yield from stream.receive(config.RELAY_IDLE_TIMEOUT)
+            completed = True
+            hub.finish_receive(transfer, stream)
+        except RelayError as e:
+            print(f"⚠️ Relay stream {transfer.id}/{index} dropped: {e}")
+        finally:
+            if not completed:
+                if stream.mode == 'pipe':
+                    # Piped bytes are gone; unblock the sender instead of letting it wait out the idle timeout
+                    stream.abort('Receiver disconnected')
+                else:
+                    # The spool (or a sender still to come) is kept for the receiver to reconnect
+                    stream.detach_receiver()
+    
+    download_name = transfer.filename if len(transfer.streams) == 1 else f'{transfer.filename}.part{index}'
+    response = Response(generate(), mimetype=mimetypes.guess_type(transfer.filename)[0] or 'application/octet-stream')
+    response.headers['Content-Disposition'] = f'attachment; filename="{download_name}"'
+    response.headers['Cache-Control'] = 'no-store'
+    response.headers['X-Relay-Stream'] = f'{index}/{len(transfer.streams)}'
+    return response
+
+@bp.route('/health')
+def health_check():
+    core = current_core()
+    try:
+        uploads_ok = os.path.exists(core.upload_folder)
+        
+        health_status = {
+            'status': 'healthy' if uploads_ok else 'unhealthy',
+            'timestamp': datetime.now().strftime('%Y-%m-%d %H:%M:%S'),
+            'version': config.VERSION,
+            'service': config.SERVICE_NAME,
+            'deployment': core.settings['deployment'],
+            'copyright': 'Copyright (c) 2025 Balsim Technologies. All rights reserved.',
+            'features': ['file_locking', 'military_grade_encryption', 'rate_limiting', 'compression', 'integrity_verification', 'direct_cloud_transfer', 'lan_relay', 'share_links', 'previews', 'live_events', 'delta_upload'],
+            'checks': {
+                'uploads_directory': uploads_ok
+            },
+            'node': get_node_id(),
+            'multi_node': core.multi_node,
+            'compression': compression_stats(),
+            'relay': core.relay.stats() if core.relay else None,
+            'storage': core.capacity.usage(),
+            'header_index': core.headers.stats(),
+            'scheduler': core.scheduler.stats() if core.scheduler else None,
+            'routing': core.upload_router.stats(),
+            'previews': core.previews.stats(),
+            'events': core.events.stats(),
+            'reconcile': core.last_reconcile
+        }
+        
+        return jsonify(health_status), 200 if health_status['status'] == 'healthy' else 503
+        
+    except Exception as e:
+        print(f"❌ Health check error: {str(e)}")
+        return jsonify({'error': 'Health check failed'}), 500
+
+def create_app(profile='server'):
+    """Application factory used by gunicorn, Vercel and __main__"""
+    core = TransferCore(profile)
+    app = Flask(__name__)
+    app.request_class = TransferRequest
+    app.secret_key = core.secret_key  # Same key on every worker so sessions verify anywhere
+    app.config['MAX_CONTENT_LENGTH'] = config.MAX_CONTENT_LENGTH
+    app.config['PERMANENT_SESSION_LIFETIME'] = timedelta(hours=24)
+    app.extensions['b_transfer'] = core
+    app.register_blueprint(bp)
+    return app
@@ -0,0 +1,76 @@
+#!/usr/bin/env python3
+"""
+Cold-Start Benchmark for B-Transfer
+Times importing the server and the Vercel handler in fresh interpreters and
+fails when the median exceeds the budget, a heavy dependency is imported
+eagerly, or a background thread is started at import time.
+
+Usage: python3 benchmarks/bench_import.py [--runs 7] [--budget-ms 300]
+"""
+
+import os
+import sys
+import json
+import argparse
+import tempfile
+import statistics
+import subprocess
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Must not be imported until first use
+HEAVY_MODULES = ['cryptography.hazmat', 'googleapiclient', 'google_auth_oauthlib', 'zstandard', 'PIL']
+
+TARGETS = {
+    'b_transfer_server': 'import b_transfer_server',
+    'api/index.py': (
+        "import importlib.util; "
+        "spec = importlib.util.spec_from_file_location('vercel_index', 'api/index.py'); "
+        "spec.loader.exec_module(importlib.util.module_from_spec(spec))"
+    )
+}
+
+CHILD = '''
+import sys, time, json, threading
+start = time.perf_counter()
+{statement}
+elapsed = (time.perf_counter() - start) * 1000
+heavy = [m for m in {heavy!r} if any(name == m or name.startswith(m + '.') for name in sys.modules)]
+print(json.dumps({{'ms': elapsed, 'heavy': heavy, 'threads': threading.active_count()}}))
+'''
+
+
+def run_once(statement, data_dir):
+    env = dict(os.environ, B_TRANSFER_DATA_DIR=data_dir, PYTHONDONTWRITEBYTECODE='1')
+    output = subprocess.run(
+        [sys.executable, '-c', CHILD.format(statement=statement, heavy=HEAVY_MODULES)],
+        cwd=REPO_ROOT, env=env, capture_output=True, text=True, check=True
+    ).stdout
+    return json.loads(output.strip().splitlines()[-1])
+
+
+def main():
+    parser = argparse.ArgumentParser(description='B-Transfer import-time benchmark')
+    parser.add_argument('--runs', type=int, default=7)
+    parser.add_argument('--budget-ms', type=float, default=float(os.environ.get('IMPORT_BUDGET_MS', 300)))
+    args = parser.parse_args()
+
+    failed = False
+    with tempfile.TemporaryDirectory() as data_dir:
+        for name, statement in TARGETS.items():
+            results = [run_once(statement, data_dir) for _ in range(args.runs)]
+            median = statistics.median(r['ms'] for r in results)
+            heavy = sorted({m for r in results for m in r['heavy']})
+            threads = max(r['threads'] for r in results)
+
+            ok = median <= args.budget_ms and not heavy and threads == 1
+            failed = failed or not ok
+            print(f"{'✅' if ok else '❌'} {name}: median {median:.1f} ms "
+                  f"(budget {args.budget_ms:.0f} ms), threads at import: {threads}"
+                  + (f", eager heavy imports: {', '.join(heavy)}" if heavy else ''))
+
+    return 1 if failed else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,119 @@
+#!/usr/bin/env python3
+"""
+Memory Benchmark for B-Transfer
+Measures peak Python heap and garbage collections while locking (with its
+manifest), unlocking and scrubbing a large file, plus the footprint of the in-memory file catalog.
+Fails when a peak grows with the file instead of staying at a few buffers,
+or the catalog costs more per file than the budget.
+
+Usage: python3 benchmarks/bench_memory.py [--size-mb 64] [--files 100000]
+"""
+
+import os
+import gc
+import sys
+import time
+import argparse
+import tempfile
+import tracemalloc
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, REPO_ROOT)
+
+from b_transfer.capacity import CapacityManager  # noqa: E402
+from b_transfer.crypto import CHUNK_SIZE, encrypt_stream, decrypt_stream  # noqa: E402
+from b_transfer.integrity import ChunkHasher, rehash_first_chunk, verify_file  # noqa: E402
+
+PASSWORD = 'benchmark'
+
+
+def measure(fn):
+    """(seconds, peak traced bytes, gc collections) for one call"""
+    gc.collect()
+    collections = sum(stats['collections'] for stats in gc.get_stats())
+    tracemalloc.start()
+    started = time.perf_counter()
+    fn()
+    elapsed = time.perf_counter() - started
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return elapsed, peak, sum(stats['collections'] for stats in gc.get_stats()) - collections
+
+
+def bench_files(size, work_dir):
+    plain = os.path.join(work_dir, 'plain.bin')
+    locked = os.path.join(work_dir, 'locked.bin')
+    unlocked = os.path.join(work_dir, 'unlocked.bin')
+    with open(plain, 'wb') as f:
+        for _ in range(size // CHUNK_SIZE):
+            f.write(os.urandom(CHUNK_SIZE))
+
+    manifest = {}
+
+    def lock():
+        # As /lock does it: the ciphertext is hashed on the way out
+        hasher = ChunkHasher(whole=False)
+        with open(plain, 'rb') as src, open(locked, 'wb') as dst:
+            encrypt_stream(src, dst, PASSWORD, hasher=hasher)
+        manifest.update(rehash_first_chunk(hasher.manifest(), locked))
+
+    def unlock():
+        with open(locked, 'rb') as src, open(unlocked, 'wb') as dst:
+            decrypt_stream(src, dst, PASSWORD)
+
+    def scrub():
+        if verify_file(locked, manifest) != -1:
+            raise RuntimeError('scrub mismatch')
+
+    results = {name: measure(fn) for name, fn in
+               [('lock', lock), ('unlock', unlock), ('scrub', scrub)]}
+    with open(plain, 'rb') as a, open(unlocked, 'rb') as b:
+        if a.read() != b.read():
+            raise RuntimeError('unlock did not restore the file')
+    return results
+
+
+def bench_catalog(count, work_dir):
+    """Traced bytes per file tracked by the capacity catalog"""
+    capacity = CapacityManager(work_dir)
+    capacity._load()
+    names = [f"file_{i:08d}.pdf" for i in range(count)]
+    gc.collect()
+    tracemalloc.start()
+    before, _ = tracemalloc.get_traced_memory()
+    for name in names:
+        capacity.record_update(name, 1024 * 1024)
+    after, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return (after - before) / count
+
+
+def main():
+    parser = argparse.ArgumentParser(description='B-Transfer memory benchmark')
+    parser.add_argument('--size-mb', type=int, default=64)
+    parser.add_argument('--files', type=int, default=100000)
+    parser.add_argument('--peak-budget-mb', type=float, default=8, help='peak Python heap per file operation')
+    parser.add_argument('--catalog-budget', type=int, default=128, help='catalog bytes per tracked file')
+    args = parser.parse_args()
+
+    failed = False
+    with tempfile.TemporaryDirectory() as work_dir:
+        for name, (elapsed, peak, collections) in bench_files(args.size_mb * 1024 * 1024, work_dir).items():
+            ok = peak <= args.peak_budget_mb * 1024 * 1024
+            failed = failed or not ok
+            print(f"{'✅' if ok else '❌'} {name} {args.size_mb}MB: peak {peak / 1024 / 1024:.1f} MB "
+                  f"(budget {args.peak_budget_mb:.0f} MB), {collections} gc collections, "
+                  f"{args.size_mb / elapsed:.0f} MB/s")
+
+    with tempfile.TemporaryDirectory() as work_dir:
+        per_file = bench_catalog(args.files, work_dir)
+        ok = per_file <= args.catalog_budget
+        failed = failed or not ok
+        print(f"{'✅' if ok else '❌'} catalog: {per_file:.0f} bytes per file over {args.files} files "
+              f"(budget {args.catalog_budget})")
+
+    return 1 if failed else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())